@@ -0,0 +1,100 @@
+import chess
+
+WIN_SCORE = 1000  # centipawns
+WIN_MOVES = 4
+DRAW_SCORE = 10
+DRAW_MOVES = 8
+DRAW_MOVE_NUMBER = 40
+
+
+def is_trivial_draw(board):
+    """
+    Material no one can win with against reasonable defence, a superset of insufficient material:
+    no pawns, rooks or queens, and at most a minor piece a side, or two knights against a bare king
+    """
+    if board.pawns or board.rooks or board.queens:
+        return False
+    minors = [bin(board.occupied_co[color] & ~board.kings).count('1') for color in chess.COLORS]
+    if max(minors) <= 1:
+        return True
+    knights_only = [bin(board.occupied_co[color] & board.knights).count('1') for color in chess.COLORS]
+    return sorted(minors) == [0, 2] and max(knights_only) == 2
+
+
+class Adjudicator:
+    def __init__(self, win_score=WIN_SCORE, win_moves=WIN_MOVES, draw_score=DRAW_SCORE, draw_moves=DRAW_MOVES,
+                 draw_move_number=DRAW_MOVE_NUMBER, material=True):
+        """
+        Ends games whose result is no longer in doubt, going by the scores the engines report for their moves.
+        @param win_score, win_moves: a side wins when both engines agree it's at least win_score ahead
+            for win_moves moves each in a row
+        @param draw_score, draw_moves, draw_move_number: a draw when both scores stay within draw_score
+            of zero for draw_moves moves each, from move draw_move_number on
+        @param material: also a draw as soon as is_trivial_draw
+        """
+        self.win_score = win_score
+        self.win_moves = win_moves
+        self.draw_score = draw_score
+        self.draw_moves = draw_moves
+        self.draw_move_number = draw_move_number
+        self.material = material
+        self.win_streak = 0  # plies in a row with the same side ahead by win_score
+        self.win_color = None
+        self.draw_streak = 0
+
+    def reset(self):
+        self.win_streak = 0
+        self.win_color = None
+        self.draw_streak = 0
+
+    def update(self, board, eval):
+        """
+        Call after every move that didn't end the game
+        @param board: board after the move
+        @param eval: score the mover's engine gave the move, centipawns for the mover, None if it has none
+        @return: (winner color or None, reason) once the game can be adjudicated, else None
+        """
+        if self.material and is_trivial_draw(board):
+            return None, "adjudication_material"
+        if eval is None:  # book moves and engines without scores break every streak
+            self.reset()
+            return None
+        white_eval = eval if board.turn == chess.BLACK else -eval  # the mover is the side not to move
+        if abs(white_eval) >= self.win_score:
+            color = white_eval > 0
+            self.win_streak = self.win_streak + 1 if color == self.win_color else 1
+            self.win_color = color
+        else:
+            self.win_streak = 0
+            self.win_color = None
+        if abs(white_eval) <= self.draw_score and board.fullmove_number >= self.draw_move_number:
+            self.draw_streak += 1
+        else:
+            self.draw_streak = 0
+        if self.win_streak >= 2 * self.win_moves:
+            return self.win_color, "adjudication_win"
+        if self.draw_streak >= 2 * self.draw_moves:
+            return None, "adjudication_draw"
+        return None
+
+    def settings(self):
+        return {'win_score': self.win_score, 'win_moves': self.win_moves, 'draw_score': self.draw_score,
+                'draw_moves': self.draw_moves, 'draw_move_number': self.draw_move_number, 'material': self.material}
+
+
+def add_adjudication_arguments(parser):
+    """Adjudication options shared by the match runners"""
+    parser.add_argument('--adjudicate', action='store_true', help="end decided games early, by score or material")
+    parser.add_argument('--win-score', type=int, default=WIN_SCORE)
+    parser.add_argument('--win-moves', type=int, default=WIN_MOVES)
+    parser.add_argument('--draw-score', type=int, default=DRAW_SCORE)
+    parser.add_argument('--draw-moves', type=int, default=DRAW_MOVES)
+    parser.add_argument('--draw-move-number', type=int, default=DRAW_MOVE_NUMBER)
+
+
+def adjudication_settings(args):
+    """Adjudicator settings from parsed options, None without --adjudicate"""
+    if not args.adjudicate:
+        return None
+    return {'win_score': args.win_score, 'win_moves': args.win_moves, 'draw_score': args.draw_score,
+            'draw_moves': args.draw_moves, 'draw_move_number': args.draw_move_number, 'material': True}
@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import chess
+
+from engines.move_ordering import MoveOrderer
+from engines.v1_random import v1_Random
+from engines.v2_eval import v2_Eval
+from game import Game
+from v3_minimax import v3_Minimax
+
+# bump the version whenever the position list changes, results of different versions aren't comparable
+BENCH_VERSION = 1
+# standard perft positions and two simple endgames, then positions from seeded random games
+BENCH_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "8/8/8/4k3/8/8/4P3/4K3 w - - 0 1",
+    "8/5pk1/6p1/8/8/6P1/5PK1/3R4 w - - 0 1",
+    "rnb1nN1r/p1k5/2p1pp2/3p2B1/p7/R1PP2P1/1P2PK1P/1N2QR1B w - - 3 18",
+    "rn2k2r/ppq2p2/2b2P2/2b3p1/3P4/6P1/PPP2PBP/R1B1K1NR w KQkq - 0 13",
+    "8/1k4n1/8/P2N4/7p/4K3/3B2PP/R6R b - - 1 36",
+    "1Br3b1/5k1p/r4p2/p7/P5P1/5NK1/7P/5R2 w - - 0 34",
+    "1n1k1B1r/2Nbqp1n/1p2p3/3P4/2p5/5P2/3rP1PP/2K2BNR w - - 1 20",
+    "r3k1nr/p1p2pp1/1p6/4p2P/Pb2P3/2N4R/3P1P2/R1BQK3 b Qkq - 0 14",
+    "rnb1k2r/1ppq2pp/p3pn2/3p1B2/8/b5P1/PPPPPP1P/R1BQ1RK1 b kq - 1 9",
+    "6nr/3kp3/7b/4P3/6pp/1PKb1N1P/5P2/5R2 w - - 1 34",
+    "1nb3nr/1p3p1p/3bk2p/1p5P/3p4/1K6/3R4/8 w - - 6 32",
+    "5r1k/5p1p/p4n1p/p7/1P6/8/4KR2/R1r5 b - - 1 38",
+    "1nb2r2/3B4/1k6/p4P2/P4Pp1/2N3P1/1PPK4/R5R1 w - - 1 27",
+    "2k1r3/6p1/2p2Q1n/7p/2P5/q6P/3P1PP1/2B2RK1 b - - 0 23",
+    "r7/p4p1p/2pp2p1/4nkP1/1PP5/P7/1B1P2KP/RN3R2 b - - 0 27",
+    "2b1k3/2pp2pp/7n/1p6/4Pr2/Pr3P2/1BP2KP1/R7 w - - 1 24",
+    "rnbq1k1r/ppp2p1p/4pnp1/3B4/P6N/6P1/1bPPPP1P/RNBQ1RK1 w - - 1 8",
+    "3rb3/8/5p2/2bk2P1/P4p2/1P5P/6K1/5R2 b - - 2 39",
+    "rnb4r/p1k2p2/6pp/8/P1pN1P2/6PP/P2BP3/4KB1R b K - 1 20",
+    "4k2r/1b1pb3/7p/2q2pB1/1P5P/5P1R/B7/1R1K2Nn b - - 4 24",
+    "r2q1bnr/p1p1kp2/b3p3/6pp/n2P4/2P2NP1/PP2PPBP/RNB2RK1 b - - 0 12",
+    "rn5r/p1p2kp1/8/PP1pp1qp/8/b7/1P1PNP1P/R1B1KB1R b - - 2 15",
+    "r1b1k2r/ppn3pp/4p3/6p1/2B1P2B/P7/P3K1PP/R6n b kq - 0 19",
+    "r1b1Bkn1/p3q3/4Pp2/1P6/7N/4P2P/1PnK1RP1/2R5 b - - 0 31",
+    "rn6/p4kp1/8/1Np5/5Pp1/2P4P/r1PB3R/4K3 b - - 0 31",
+    "rnbk1b1r/2p2ppp/1p2p3/p2pP3/2P4P/8/PP1Q1P2/RNB2R1K b - - 0 12",
+    "3B2k1/8/1p6/p1p1R2p/2Pn1p2/P7/7R/2K2BN1 b - - 1 33",
+    "rn2r1k1/p1p1bp2/1p2b1B1/8/2PP4/PP6/5PP1/R2Q1KNR b - - 2 16",
+    "5b2/2k2B2/r3p3/p3P2p/bp5P/6P1/P4B2/RNN2RK1 w - - 0 31",
+    "rn1qkb1r/p3pppp/1p1p4/3N3Q/3NP3/P7/1PP2PPP/R1B1KbR1 b Qkq - 1 10",
+    "r1bqkrn1/ppp2pbp/2np4/1N2p1p1/1BPPP3/5P2/PP4PP/1R1QKBNR w Kq - 0 10",
+    "rnb4r/ppp2pb1/2kNp1pp/8/3P4/2KQ4/PP4P1/R1B2q1R w - - 0 16",
+    "r1bqk2r/ppppbppp/5n2/3Pn3/2PQN3/6p1/PP2P1BP/R1B1K1NR w KQkq - 6 11",
+    "r1b5/1pr3kp/p7/P5P1/2P3B1/8/1P5b/4K2R b - - 1 33",
+    "r3k1r1/pppb1p1p/2n4n/5p2/5B2/8/P1P2KPP/4R1R1 b q - 1 18",
+    "r1bqkbnr/ppp1nppp/8/4N3/4p3/P7/1PPPBPPP/RNBQK2R b KQkq - 0 6",
+    "6k1/1pp2b2/7p/8/8/8/1P6/1RN1K1B1 b - - 4 35",
+    "rn1qkb1r/p3ppp1/1p1p4/7p/3Nn3/2N4P/PPP2P1P/1RBQKB1R b Kkq - 1 9",
+    "1nb1n2r/3rkp2/2q1p1pb/1p1p3p/3RPQ2/6PN/1PBK1P1P/1NB4R w - - 1 23",
+    "r7/p1pkN2q/3p4/1p6/3QP1p1/P3B3/1P4r1/1R3KN1 b - - 0 26",
+    "r7/p4k2/7R/4p1pp/8/1P3KP1/P3P3/8 b - - 2 35",
+    "r3k3/p2n1prp/1Rp1p3/8/P1bPQ1P1/5P2/2P4P/4K1NR w Kq - 1 18",
+    "6r1/3b1p1R/8/1kP3P1/5N2/B2P4/6K1/1N6 w - - 1 38",
+    "rn1qk1nr/p4p1p/1p2p3/1b1pP3/1b1P1P2/7P/1P1Q1P2/4K1NR b kq - 3 15",
+    "1rb2k1B/1p1p1p1p/8/2p2np1/2N3QP/8/P1PqBPP1/RN3RK1 w - - 0 17",
+    "rn1qkbr1/pp2pppp/3p4/3n4/3NP1b1/2N2P2/PPP3PP/R1B1KB1R w KQq - 0 8",
+    "1n5r/1R6/2k5/r5pp/3P3N/1P3K1P/1P4P1/5Q1R b - - 0 24",
+    "rn4nr/p2kppbp/2p3p1/1p1pP3/3P4/N4KPq/PP1B1PBP/R2Q3R b - - 1 13",
+]
+ENGINES = {'v1_Random': v1_Random, 'v2_Eval': v2_Eval, 'v3_Minimax': v3_Minimax}
+DEFAULT_DEPTH = 4
+DEFAULT_SEED = 1
+REGRESSION_THRESHOLD = 0.10  # fraction nodes/sec may drop, or time to depth may grow, before the bench fails
+MIN_TIMED = 0.1  # seconds, engines that finish all positions faster than this are too noisy to compare on time
+REPEATS = 5  # every engine is benched this many times and its fastest run is kept, one run is ~10% noisy
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far, None where the resource module doesn't exist.
+    It's a high-water mark, so every engine benched after another reports at least the earlier one's peak
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB elsewhere
+
+
+def bench_engine(name, depth, seed):
+    """
+    Plays one move in every bench position, each from a fresh table and move ordering history
+    @return: result dict, nodes and the moves played are the determinism signature
+    """
+    random.seed(seed)  # v1 and v2 pick among equal moves at random
+    game = Game()
+    engine = v3_Minimax(game, depth=depth) if name == 'v3_Minimax' else ENGINES[name](game)
+    nodes = 0
+    moves = []
+    total_time = 0
+    for fen in BENCH_FENS:
+        game.board = chess.Board(fen)
+        if name == 'v3_Minimax':
+            engine.tt.clear()
+            engine.orderer = MoveOrderer()
+        elif name == 'v2_Eval':
+            nodes += game.board.legal_moves.count()  # v2 scores every child once
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # game over messages
+            engine.move()
+        total_time += time.perf_counter() - start
+        if name == 'v3_Minimax':
+            nodes += engine.positions_evaluated + engine.qnodes
+        moves.append(game.board.peek().uci())
+    return {
+        'engine': name,
+        'nodes': nodes,
+        'nps': nodes / total_time if total_time > 0 else 0.0,
+        'time': total_time,
+        'time_to_depth': total_time / len(BENCH_FENS),
+        'process_peak_rss_mb': peak_rss_mb(),
+        'moves_signature': hashlib.sha1(' '.join(moves).encode()).hexdigest()[:16],
+    }
+
+
+def best_of(name, depth, seed, repeats):
+    """Fastest of several runs, the search is deterministic so only the timing differs between them"""
+    return min((bench_engine(name, depth, seed) for _ in range(repeats)), key=lambda result: result['time'])
+
+
+def run_bench(engine_names, depth=DEFAULT_DEPTH, seed=DEFAULT_SEED, repeats=REPEATS):
+    return {
+        'version': BENCH_VERSION,
+        'positions': len(BENCH_FENS),
+        'depth': depth,
+        'seed': seed,
+        'python': sys.version.split()[0],
+        'repeats': repeats,
+        'engines': {name: best_of(name, depth, seed, repeats) for name in engine_names},
+    }
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Prints how the results differ from a baseline
+    @return: list of regression messages, empty if nothing got slower than the threshold allows
+    """
+    regressions = []
+    if (baseline['version'], baseline['depth'], baseline['seed']) != \
+            (results['version'], results['depth'], results['seed']):
+        print("baseline was run with a different position set, depth or seed, node counts won't match")
+    for name, result in results['engines'].items():
+        base = baseline['engines'].get(name)
+        if base is None:
+            print(f"{name}: not in the baseline")
+            continue
+        if (result['nodes'], result['moves_signature']) != (base['nodes'], base['moves_signature']):
+            print(f"{name}: search changed, {base['nodes']} -> {result['nodes']} nodes")
+        if base['time'] < MIN_TIMED:
+            continue
+        if base['nps'] and result['nps'] < base['nps'] * (1 - threshold):
+            regressions.append(f"{name}: nodes/sec {base['nps']:.0f} -> {result['nps']:.0f}")
+        if base['time_to_depth'] and result['time_to_depth'] > base['time_to_depth'] * (1 + threshold):
+            regressions.append(f"{name}: time to depth {base['time_to_depth']:.4f}s -> {result['time_to_depth']:.4f}s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fixed position benchmark of the engines")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="v3_Minimax search depth")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--output', help="save the results as JSON")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="runs per engine, the fastest is kept")
+    args = parser.parse_args()
+
+    results = run_bench(args.engines, args.depth, args.seed, args.repeats)
+    print(f"bench v{BENCH_VERSION}: {len(BENCH_FENS)} positions, depth {args.depth}, seed {args.seed}, "
+          f"best of {args.repeats}")
+    print(f"{'Engine':>12} | {'Nodes':>10} | {'Nodes/sec':>10} | {'Time to depth':>13} | {'Process peak':>12} | Moves")
+    for result in results['engines'].values():
+        rss = result.get('process_peak_rss_mb')
+        rss = f"{rss:.0f} MB" if rss is not None else "?"
+        print(f"{result['engine']:>12} | {result['nodes']:>10} | {result['nps']:>10.0f} | "
+              f"{result['time_to_depth']:>12.4f}s | {rss:>12} | {result['moves_signature']}")
+
+    if args.output:
+        folder = os.path.dirname(args.output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
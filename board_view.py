@@ -0,0 +1,118 @@
+import chess
+import pygame
+
+SCREEN_WIDTH = 640
+SQUARE_SIZE = 80
+LIGHT_BROWN = (237, 214, 176, 255)
+DARK_BROWN = (184, 135, 98, 255)
+DARK_HIGHLIGHT_COLOR = (224, 196, 76)
+LIGHT_HIGHLIGHT_COLOR = (248, 236, 116)
+POPUP_WIDTH = 300
+POPUP_HEIGHT = 125
+
+
+def board_surface():
+    """The empty board, drawn once and copied from instead of drawing 64 rects every frame"""
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_WIDTH))
+    for row in range(8):
+        for col in range(8):
+            color = LIGHT_BROWN if (row + col) % 2 == 0 else DARK_BROWN
+            surface.fill(color, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    return surface
+
+
+def popup_surface(font, text):
+    """Translucent box with a border and centered text, such as the game over popup"""
+    surface = pygame.Surface((POPUP_WIDTH, POPUP_HEIGHT), pygame.SRCALPHA)
+    surface.fill((0, 0, 0, 128))  # (R, G, B, A) with A = 128 for 50% transparency
+    pygame.draw.rect(surface, (255, 255, 255), (0, 0, POPUP_WIDTH, POPUP_HEIGHT), 5)
+    text_surface = font.render(text, True, (255, 255, 255))
+    surface.blit(text_surface, (POPUP_WIDTH / 2 - text_surface.get_width() / 2,
+                                POPUP_HEIGHT / 2 - text_surface.get_height() / 2))
+    return surface
+
+
+def centered(surface):
+    """Position that centers a surface in the window"""
+    return int(SCREEN_WIDTH / 2 - surface.get_width() / 2), int(SCREEN_WIDTH / 2 - surface.get_height() / 2)
+
+
+class BoardView:
+    def __init__(self, screen, piece_images):
+        """
+        Draws the board with dirty rectangles: every frame only the squares whose piece or highlight changed are
+        copied from the pre-rendered board, and only those parts of the window are updated.
+        Overlays (popups, a dragged piece) are drawn last, the squares beneath them are redrawn whenever they
+        change so translucent overlays never blend over themselves.
+        """
+        self.screen = screen
+        self.piece_images = piece_images
+        self.board = board_surface()
+        self.drawn = {}  # square: (piece symbol or None, highlighted) as it is on the screen
+        self.flipped = None
+        self.overlay_rects = []  # overlays of the last frame
+
+    def invalidate(self):
+        """Redraw everything on the next frame, after the window lost its contents"""
+        self.drawn = {}
+
+    def square_rect(self, square):
+        col, row = chess.square_file(square), chess.square_rank(square)
+        if not self.flipped:  # white at the bottom
+            row = 7 - row
+        return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+    def squares_under(self, rect):
+        rect = rect.clip(self.screen.get_rect())
+        squares = []
+        for row in range(rect.top // SQUARE_SIZE, (rect.bottom - 1) // SQUARE_SIZE + 1):
+            for col in range(rect.left // SQUARE_SIZE, (rect.right - 1) // SQUARE_SIZE + 1):
+                squares.append(chess.square(col, row if self.flipped else 7 - row))
+        return squares
+
+    def render(self, board, flipped=False, highlighted=(), hidden=None, overlays=()):
+        """
+        Brings the window up to date and updates only what changed
+        @param flipped: black at the bottom
+        @param highlighted: squares to highlight, the last move and the selected piece
+        @param hidden: square whose piece isn't drawn, it's being dragged
+        @param overlays: (surface, position) drawn on top of the board
+        """
+        if flipped != self.flipped:
+            self.flipped = flipped
+            self.drawn = {}
+        pieces = board.piece_map()
+        wanted = {}
+        for square in chess.SQUARES:
+            piece = pieces.get(square)
+            wanted[square] = (piece.symbol() if piece and square != hidden else None, square in highlighted)
+        dirty = {square for square in chess.SQUARES if self.drawn.get(square) != wanted[square]}
+
+        overlay_rects = [surface.get_rect(topleft=position) for surface, position in overlays]
+        under = set()
+        for rect in overlay_rects + self.overlay_rects:
+            under.update(self.squares_under(rect))
+        redraw_overlays = overlay_rects != self.overlay_rects or bool(dirty & under)
+        if redraw_overlays:
+            dirty |= under
+        if not dirty and not redraw_overlays:
+            return
+
+        updated = []
+        for square in dirty:
+            rect = self.square_rect(square)
+            symbol, highlight = wanted[square]
+            self.screen.blit(self.board, rect, rect)
+            if highlight:
+                light = (rect.x // SQUARE_SIZE + rect.y // SQUARE_SIZE) % 2 == 0
+                self.screen.fill(LIGHT_HIGHLIGHT_COLOR if light else DARK_HIGHLIGHT_COLOR, rect)
+            if symbol is not None:
+                self.screen.blit(self.piece_images[symbol], rect)
+            self.drawn[square] = wanted[square]
+            updated.append(rect)
+        if redraw_overlays:
+            for surface, position in overlays:
+                self.screen.blit(surface, position)
+            updated.extend(overlay_rects)
+        self.overlay_rects = overlay_rects
+        pygame.display.update(updated)
@@ -0,0 +1,340 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import multiprocessing
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+
+from adjudication import Adjudicator, add_adjudication_arguments, adjudication_settings
+from match_log import resume_settings
+from results_db import ResultsStore
+from simulate import Simulate, ENGINES, play_game_job
+from sprt import SPRT
+
+DEFAULT_HOST = '127.0.0.1'  # only this machine's workers can connect, other hosts need a --token
+DEFAULT_PORT = 5555
+HEARTBEAT_INTERVAL = 5  # seconds between a worker's heartbeats while it plays
+HEARTBEAT_TIMEOUT = 30  # a game is handed out again when its worker has been silent this long
+WAIT_INTERVAL = 1  # how long an idle worker waits before asking again, while the last games are still out
+GAME_TIMEOUT = 3600  # a game still out after this many seconds is assumed hung and handed out again
+
+
+def send_message(sock, message, lock=None):
+    """Messages are JSON objects, one per line"""
+    data = (json.dumps(message) + "\n").encode()
+    if lock is None:
+        sock.sendall(data)
+    else:
+        with lock:
+            sock.sendall(data)
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # a host name, which other machines may resolve too
+        return False
+
+
+def check_exposure(host, token):
+    """@raise ValueError: serving on a public address without a token would take jobs and results from anyone"""
+    if token is None and not is_loopback(host):
+        raise ValueError(f"{host} is reachable from other machines, it needs a token the workers have to send")
+
+
+class Coordinator:
+    def __init__(self, game_jobs, match_log, bot1_name, sprt=None, heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 results=None, token=None, game_timeout=GAME_TIMEOUT):
+        """
+        Hands out game jobs to workers over TCP and logs the games they send back.
+        Every connection is one worker. A game comes back into the queue when its worker disconnects, stops
+        sending heartbeats or is still playing it after game_timeout, and a game that ends up played twice is only
+        logged once.
+        @param game_jobs: jobs as planned by Simulate.plan_jobs
+        @param results: optional ResultsStore, it's only written from the thread that serves the match
+        @param token: shared secret every worker message has to carry, None accepts any worker
+        @param game_timeout: seconds a game may take before it's handed out again, None never
+        """
+        self.pending = deque(game_jobs)
+        self.remaining = {job[0] for job in game_jobs}
+        self.running = {}  # game: [job, worker, time of the worker's last message, time it was handed out]
+        self.match_log = match_log
+        self.bot1_name = bot1_name
+        self.sprt = sprt
+        self.heartbeat_timeout = heartbeat_timeout
+        self.token = token
+        self.game_timeout = game_timeout
+        self.results = results
+        self.finished_games = []  # (record, stats) for the results store
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if not self.remaining:
+            self.finished.set()
+
+    def next_job(self, worker):
+        """@return: a job, 'wait' while every remaining game is out, or 'done'"""
+        with self.lock:
+            self.requeue_expired()
+            if self.finished.is_set():
+                return 'done'
+            while self.pending:
+                job = self.pending.popleft()
+                if job[0] in self.remaining:  # not already sent back by a worker that was written off
+                    now = time.time()
+                    self.running[job[0]] = [job, worker, now, now]
+                    return job
+            return 'wait'
+
+    def authorized(self, message):
+        if self.token is None:
+            return True
+        return hmac.compare_digest(str(message.get('token', '')), self.token)
+
+    def heartbeat(self, worker):
+        with self.lock:
+            now = time.time()
+            for running in self.running.values():
+                if running[1] == worker:
+                    running[2] = now
+
+    def result(self, worker, record, stats):
+        with self.lock:
+            game = record['game']
+            self.running.pop(game, None)
+            if game not in self.remaining:  # played twice after a requeue
+                return
+            self.remaining.discard(game)
+            self.match_log.append(record)
+            if self.results is not None:
+                self.finished_games.append((record, stats))
+            decided = Simulate.add_to_sprt(self.sprt, record, self.bot1_name)
+            if decided or not self.remaining:
+                self.finished.set()
+
+    def worker_lost(self, worker):
+        with self.lock:
+            for game in [game for game, running in self.running.items() if running[1] == worker]:
+                self.pending.appendleft(self.running.pop(game)[0])
+
+    def requeue_expired(self):
+        """
+        Takes back games of workers that went silent, and games that are taking too long, call with the lock held.
+        A worker whose game hangs keeps sending heartbeats, the game timeout is what catches it.
+        """
+        now = time.time()
+        for game, running in list(self.running.items()):
+            if running[2] < now - self.heartbeat_timeout:
+                print(f"game {game}: no heartbeat from worker {running[1]}, handing it out again")
+            elif self.game_timeout is not None and running[3] < now - self.game_timeout:
+                print(f"game {game}: worker {running[1]} still playing after {self.game_timeout}s, "
+                      f"handing it out again")
+            else:
+                continue
+            self.pending.appendleft(self.running.pop(game)[0])
+
+    def store_results(self):
+        """sqlite connections belong to the thread that made them, handler threads queue their games for it"""
+        for record, stats in self.finished_games:
+            self.results.add_game(record, stats)
+        self.finished_games = []
+
+    def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Runs the server until every game is logged or the SPRT is decided"""
+        check_exposure(host, self.token)
+        server = CoordinatorServer((host, port), CoordinatorHandler)
+        server.coordinator = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        while not self.finished.wait(WAIT_INTERVAL):
+            with self.lock:
+                self.requeue_expired()
+                self.store_results()
+        server.shutdown()
+        with self.lock:
+            self.store_results()
+        server.server_close()
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = f"{self.client_address[0]}:{self.client_address[1]}"
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if not coordinator.authorized(message):
+                    send_message(self.request, {'type': 'error', 'error': "wrong token"})
+                    break
+                if message['type'] == 'job':
+                    job = coordinator.next_job(worker)
+                    if isinstance(job, str):
+                        send_message(self.request, {'type': job})
+                    else:
+                        send_message(self.request, {'type': 'job', 'job': job})
+                elif message['type'] == 'heartbeat':
+                    coordinator.heartbeat(worker)
+                elif message['type'] == 'result':
+                    coordinator.result(worker, message['record'], message.get('stats', []))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            coordinator.worker_lost(worker)
+
+
+def run_worker(host=DEFAULT_HOST, port=DEFAULT_PORT, retries=10, token=None):
+    """
+    Plays the coordinator's games headless until it runs out of them
+    @param token: the coordinator's shared secret, sent with every message
+    @return: number of games played
+    """
+    for attempt in range(retries):  # the coordinator may still be starting
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except ConnectionRefusedError:
+            time.sleep(WAIT_INTERVAL)
+    else:
+        raise ConnectionError(f"no coordinator at {host}:{port}")
+    lock = threading.Lock()  # heartbeats are sent from another thread
+    playing = threading.Event()
+    closed = threading.Event()
+
+    def heartbeats():
+        while not closed.wait(HEARTBEAT_INTERVAL):
+            if playing.is_set():
+                try:
+                    send_message(sock, {'type': 'heartbeat', 'token': token}, lock)
+                except OSError:
+                    return
+
+    threading.Thread(target=heartbeats, daemon=True).start()
+    played = 0
+    replies = sock.makefile('rb')
+    try:
+        while True:
+            send_message(sock, {'type': 'job', 'token': token}, lock)
+            line = replies.readline()
+            if not line:  # coordinator finished and closed the connection
+                break
+            reply = json.loads(line)
+            if reply['type'] == 'done':
+                break
+            if reply['type'] == 'error':
+                print(f"coordinator at {host}:{port} refused the worker: {reply['error']}")
+                break
+            if reply['type'] == 'wait':
+                time.sleep(WAIT_INTERVAL)
+                continue
+            playing.set()
+            record, stats = play_game_job(reply['job'])
+            playing.clear()
+            send_message(sock, {'type': 'result', 'record': record, 'stats': stats, 'token': token}, lock)
+            played += 1
+    except ConnectionError:
+        pass
+    finally:
+        closed.set()
+        sock.close()
+    return played
+
+
+def run_distributed(num_games, bot1, bot2, clock=None, seed=0, start_fens=None, log_path=None, resume=False,
+                    sprt=None, host=DEFAULT_HOST, port=DEFAULT_PORT, local_workers=0, adjudicator=None, results=None,
+                    token=None, game_timeout=GAME_TIMEOUT):
+    """
+    Same match as Simulate.run_parallel_simulations, with the games played by workers that connect over TCP
+    @param host: address to listen on, anything but loopback needs a token
+    @param local_workers: worker processes to start on this machine, more can connect with the token
+    @param token, game_timeout: as for Coordinator
+    @return: win count of the run
+    """
+    check_exposure(host, token)  # before the match log is started
+    simulate = Simulate()
+    bot1_name, bot2_name, match_log, game_jobs = simulate.plan_jobs(num_games, bot1, bot2, clock, seed, start_fens,
+                                                                     log_path, resume, sprt, adjudicator, results)
+    coordinator = Coordinator(game_jobs, match_log, bot1_name, sprt, results=results, token=token,
+                              game_timeout=game_timeout)
+    workers = [multiprocessing.Process(target=run_worker, args=('127.0.0.1', port),
+                                       kwargs={'token': token}, daemon=True)
+               for _ in range(local_workers)]
+    for worker in workers:
+        worker.start()
+    print(f"serving {len(game_jobs)} games on {host}:{port}, log {match_log.path}")
+    coordinator.serve(host, port)
+    for worker in workers:
+        worker.join(HEARTBEAT_INTERVAL)
+    simulate.log_results(bot1_name, bot2_name, match_log)
+    if results is not None:
+        results.flush()
+    return match_log.win_count(bot1_name, bot2_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match games played by workers on other machines")
+    commands = parser.add_subparsers(dest='command', required=True)
+    coordinator_parser = commands.add_parser('coordinator', help="serve the games of a match and log the results")
+    coordinator_parser.add_argument('--games', type=int, default=10)
+    coordinator_parser.add_argument('--bot1', default='v2_Eval', choices=list(ENGINES))
+    coordinator_parser.add_argument('--bot2', default='v3_Minimax', choices=list(ENGINES))
+    coordinator_parser.add_argument('--seed', type=int, default=0)
+    coordinator_parser.add_argument('--clock', type=float, nargs=2, metavar=('BASE', 'INC'))
+    coordinator_parser.add_argument('--log', help="match log to write, named after the bots and start time by default")
+    coordinator_parser.add_argument('--resume', metavar='LOG', help="finish the run of an earlier match log")
+    coordinator_parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'))
+    coordinator_parser.add_argument('--alpha', type=float, default=0.05)
+    coordinator_parser.add_argument('--beta', type=float, default=0.05)
+    coordinator_parser.add_argument('--host', default=DEFAULT_HOST,
+                                    help="address to listen on, use 0.0.0.0 together with --token for remote workers")
+    coordinator_parser.add_argument('--token', help="shared secret workers must send, required off loopback")
+    coordinator_parser.add_argument('--game-timeout', type=float, default=GAME_TIMEOUT,
+                                    help="seconds before a game that hasn't come back is handed out again")
+    coordinator_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help="workers to start on this machine")
+    add_adjudication_arguments(coordinator_parser)
+    coordinator_parser.add_argument('--db', help="SQLite results database the run is also written to")
+    worker_parser = commands.add_parser('worker', help="play games for a coordinator")
+    worker_parser.add_argument('--host', default=DEFAULT_HOST)
+    worker_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    worker_parser.add_argument('--token', help="the coordinator's shared secret")
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        print(f"played {run_worker(args.host, args.port, token=args.token)} games")
+    else:
+        bot1, bot2 = (args.bot1, {}), (args.bot2, {})
+        games, seed, start_fens, log_path = args.games, args.seed, None, args.log
+        clock = tuple(args.clock) if args.clock else None
+        sprt = SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+        adjudication = adjudication_settings(args)
+        try:
+            check_exposure(args.host, args.token)
+        except ValueError as error:
+            coordinator_parser.error(f"{error}, give one with --token")
+        if args.resume:
+            try:
+                bot1, bot2, games, seed, start_fens, clock, sprt_settings, adjudication = resume_settings(args.resume)
+            except ValueError as error:
+                coordinator_parser.error(str(error))
+            log_path = args.resume
+            sprt = SPRT(*sprt_settings) if sprt_settings else None
+        adjudicator = Adjudicator(**adjudication) if adjudication else None
+        results = ResultsStore(args.db) if args.db else None
+        win_count = run_distributed(games, bot1, bot2, clock, seed, start_fens, log_path, bool(args.resume), sprt,
+                                    args.host, args.port, args.local_workers, adjudicator, results, args.token,
+                                    args.game_timeout)
+        if results is not None:
+            results.close()
+        print(win_count)
+        if sprt is not None:
+            print(sprt.report())
@@ -0,0 +1,101 @@
+import chess
+import numpy as np
+
+from engines.evaluation import MG_SCORES, EG_SCORES, phase_weights, MAX_PHASE
+
+# one feature per (color, piece type, square), 1 if that piece stands there
+NUM_FEATURES = 2 * 6 * 64
+
+
+def feature_index(color, piece_type, square):
+    return ((int(color) * 6) + piece_type - 1) * 64 + square
+
+
+def _weights():
+    """Columns: middlegame score, endgame score, phase weight, so a single dot product gives all three"""
+    weights = np.zeros((NUM_FEATURES, 3), dtype=np.int64)
+    for color in (chess.WHITE, chess.BLACK):
+        for piece_type in chess.PIECE_TYPES:
+            for square in chess.SQUARES:
+                index = feature_index(color, piece_type, square)
+                weights[index] = (MG_SCORES[color][piece_type][square], EG_SCORES[color][piece_type][square],
+                                  phase_weights[piece_type])
+    return weights
+
+
+WEIGHTS = _weights()
+
+
+def board_features(board):
+    """Feature vector of a board, unpacked straight from its bitboards"""
+    masks = [board.pieces_mask(piece_type, color) for color in (chess.BLACK, chess.WHITE)
+             for piece_type in chess.PIECE_TYPES]
+    return np.unpackbits(np.array(masks, dtype='<u8').view(np.uint8), bitorder='little')
+
+
+def tapered(totals, turns):
+    """
+    evaluation.tapered() for a batch
+    @param totals: (n, 3) array of middlegame, endgame and phase sums
+    @param turns: side to move of every row, True for white
+    @return: scores in centipawns from the point of view of each side to move
+    """
+    phase = np.minimum(totals[:, 2], MAX_PHASE)
+    scores = (totals[:, 0] * phase + totals[:, 1] * (MAX_PHASE - phase)) // MAX_PHASE
+    return np.where(turns, scores, -scores)
+
+
+def evaluate_children(board, moves):
+    """
+    Material and piece-square scores of every position one move away, without pushing any of them.
+    The parent's features are copied once per move and each row is patched for its move
+    (moved piece, promotion, capture, castling rook, en passant pawn), then scored in one dot product.
+    @return: scores from the point of view of the side making the moves
+    """
+    turn = board.turn
+    them = not turn
+    rows, cleared, filled = [], [], []
+    for row, move in enumerate(moves):
+        from_square = move.from_square
+        to_square = move.to_square
+        piece_type = board.piece_type_at(from_square)
+        rows.append(row)
+        cleared.append(feature_index(turn, piece_type, from_square))
+        filled.append(feature_index(turn, move.promotion or piece_type, to_square))
+        captured = board.piece_type_at(to_square)
+        if captured:
+            rows.append(row)
+            cleared.append(feature_index(them, captured, to_square))
+            filled.append(-1)
+        elif piece_type == chess.PAWN and to_square == board.ep_square:
+            rows.append(row)
+            cleared.append(feature_index(them, chess.PAWN, to_square - 8 if turn else to_square + 8))
+            filled.append(-1)
+        elif piece_type == chess.KING and abs(to_square - from_square) == 2:  # castling, move the rook too
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else \
+                (from_square - 4, from_square - 1)
+            rows.append(row)
+            cleared.append(feature_index(turn, chess.ROOK, rook_from))
+            filled.append(feature_index(turn, chess.ROOK, rook_to))
+
+    features = np.repeat(board_features(board)[np.newaxis, :], len(moves), axis=0)
+    rows = np.array(rows)
+    filled = np.array(filled)
+    features[rows, cleared] = 0
+    placed = filled >= 0
+    features[rows[placed], filled[placed]] = 1
+    return tapered(features.astype(np.int64) @ WEIGHTS, turn)
+
+
+def evaluate_boards(boards):
+    """Scores a list of boards in one dot product, each from the point of view of its side to move"""
+    if not boards:
+        return np.zeros(0, dtype=np.int64)
+    features = np.stack([board_features(board) for board in boards])
+    turns = np.array([board.turn for board in boards])
+    return tapered(features.astype(np.int64) @ WEIGHTS, turns)
+
+
+def evaluate_fens(fens):
+    """Batch API for analysis, scores a list of FEN strings"""
+    return evaluate_boards([chess.Board(fen) for fen in fens])
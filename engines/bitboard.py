@@ -0,0 +1,743 @@
+import chess
+
+from engines import zobrist
+from engines.evaluation import MG_SCORES, EG_SCORES, phase_weights, MAX_PHASE
+
+# colors and piece types use the same numbers as python-chess
+WHITE = 1
+BLACK = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+
+BB_ALL = (1 << 64) - 1
+BB_FILE_A = chess.BB_FILE_A
+BB_FILE_H = chess.BB_FILE_H
+BB_RANK_1 = chess.BB_RANK_1
+BB_RANK_3 = chess.BB_RANK_3
+BB_RANK_6 = chess.BB_RANK_6
+BB_RANK_8 = chess.BB_RANK_8
+BB_PROMOTION_RANKS = BB_RANK_1 | BB_RANK_8
+
+# moves are ints: from square (6 bits) | to square (6 bits) | promotion piece type (3 bits) | flag (2 bits)
+FLAG_NONE = 0
+FLAG_EP = 1
+FLAG_CASTLE = 2
+FLAG_DOUBLE = 3
+PROMOTION_TYPES = (QUEEN, KNIGHT, ROOK, BISHOP)
+
+# castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+
+def encode_move(from_square, to_square, promotion=0, flag=FLAG_NONE):
+    return from_square | (to_square << 6) | (promotion << 12) | (flag << 15)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return (move >> 12) & 7
+
+
+def move_flag(move):
+    return move >> 15
+
+
+def move_uci(move):
+    promotion = move_promotion(move)
+    return chess.SQUARE_NAMES[move & 63] + chess.SQUARE_NAMES[(move >> 6) & 63] + \
+        (chess.piece_symbol(promotion) if promotion else '')
+
+
+# ---------- precomputed attack tables ----------
+
+def _step_attacks(square, deltas):
+    attacks = 0
+    file, rank = square & 7, square >> 3
+    for df, dr in deltas:
+        f, r = file + df, rank + dr
+        if 0 <= f < 8 and 0 <= r < 8:
+            attacks |= 1 << (r * 8 + f)
+    return attacks
+
+
+KNIGHT_ATTACKS = [_step_attacks(sq, [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+                  for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+                for sq in range(64)]
+# PAWN_ATTACKS[color][square]: squares a pawn of that color on square attacks
+PAWN_ATTACKS = [[_step_attacks(sq, [(-1, -1), (1, -1)]) for sq in range(64)],
+                [_step_attacks(sq, [(-1, 1), (1, 1)]) for sq in range(64)]]
+
+
+def _slide(square, deltas, occupied):
+    attacks = 0
+    file, rank = square & 7, square >> 3
+    for df, dr in deltas:
+        f, r = file + df, rank + dr
+        while 0 <= f < 8 and 0 <= r < 8:
+            bit = 1 << (r * 8 + f)
+            attacks |= bit
+            if occupied & bit:
+                break
+            f, r = f + df, r + dr
+    return attacks
+
+
+def _line_tables(deltas):
+    """
+    Attack sets along one line through every square, for every arrangement of blockers on it.
+    Returns (masks, tables): masks[square] are the squares that can block, the edges never do,
+    tables[square][occupied & masks[square]] is the attack set.
+    """
+    masks = []
+    tables = []
+    for square in range(64):
+        mask = 0
+        file, rank = square & 7, square >> 3
+        for df, dr in deltas:
+            f, r = file + df, rank + dr
+            while 0 <= f + df < 8 and 0 <= r + dr < 8:
+                mask |= 1 << (r * 8 + f)
+                f, r = f + df, r + dr
+        table = {}
+        subset = 0
+        while True:  # carry-rippler walk over every subset of the mask
+            table[subset] = _slide(square, deltas, subset)
+            subset = (subset - mask) & mask
+            if subset == 0:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_MASKS, RANK_ATTACKS = _line_tables([(1, 0), (-1, 0)])
+FILE_MASKS, FILE_ATTACKS = _line_tables([(0, 1), (0, -1)])
+DIAG_MASKS, DIAG_ATTACKS = _line_tables([(1, 1), (-1, -1)])
+ANTI_MASKS, ANTI_ATTACKS = _line_tables([(-1, 1), (1, -1)])
+
+
+def bishop_attacks(square, occupied):
+    return DIAG_ATTACKS[square][occupied & DIAG_MASKS[square]] | ANTI_ATTACKS[square][occupied & ANTI_MASKS[square]]
+
+
+def rook_attacks(square, occupied):
+    return RANK_ATTACKS[square][occupied & RANK_MASKS[square]] | FILE_ATTACKS[square][occupied & FILE_MASKS[square]]
+
+
+# Zobrist keys and evaluation scores as plain lists, [color][piece_type][square]
+PIECE_KEYS = [[None] + [zobrist.PIECE_KEYS[color][pt] for pt in chess.PIECE_TYPES] for color in (False, True)]
+MG = [[None] + [MG_SCORES[color][pt] for pt in chess.PIECE_TYPES] for color in (False, True)]
+EG = [[None] + [EG_SCORES[color][pt] for pt in chess.PIECE_TYPES] for color in (False, True)]
+PHASE = [0] + [phase_weights[pt] for pt in chess.PIECE_TYPES]
+# piece values of the static exchange evaluator in centipawns, the king is never really traded
+SEE_VALUES = [0, 100, 320, 330, 500, 900, 20000]
+EP_KEYS = zobrist.EP_KEYS
+TURN_KEY = zobrist.TURN_KEY
+CASTLING_KEYS = []
+for _rights in range(16):
+    _key = 0
+    for _i in range(4):
+        if _rights & (1 << _i):
+            _key ^= zobrist.RANDOM_ARRAY[768 + _i]
+    CASTLING_KEYS.append(_key)
+
+# castling rights that survive a move touching a square
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[chess.E1] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[chess.H1] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASKS[chess.A1] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASKS[chess.E8] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[chess.H8] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASKS[chess.A8] = 15 & ~BLACK_QUEENSIDE
+
+CASTLE_WK = encode_move(chess.E1, chess.G1, 0, FLAG_CASTLE)
+CASTLE_WQ = encode_move(chess.E1, chess.C1, 0, FLAG_CASTLE)
+CASTLE_BK = encode_move(chess.E8, chess.G8, 0, FLAG_CASTLE)
+CASTLE_BQ = encode_move(chess.E8, chess.C8, 0, FLAG_CASTLE)
+# king destination -> (rook from, rook to)
+CASTLING_ROOKS = {chess.G1: (chess.H1, chess.F1), chess.C1: (chess.A1, chess.D1),
+                  chess.G8: (chess.H8, chess.F8), chess.C8: (chess.A8, chess.D8)}
+
+
+class Position:
+    def __init__(self):
+        """
+        Lean board for the search hot path, bitboards plus a mailbox, no move objects.
+        Moves are generated pseudo-legal, make() rejects (and undoes) moves that leave the king in check.
+        make()/unmake() update the Zobrist key and the evaluation totals as they go.
+        Build one with Position.from_board() at the root, the rest of the program keeps using chess.Board.
+        """
+        self.pieces = [[0] * 7, [0] * 7]  # [color][piece_type] bitboards
+        self.occupied_co = [0, 0]
+        self.occupied = 0
+        self.squares = [0] * 64  # piece_type | color << 3, 0 for empty
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.mg = 0
+        self.eg = 0
+        self.phase = 0
+        self.history = []  # (move, captured, castling, ep_square, halfmove_clock, key, mg, eg, phase)
+
+    # ---------- conversion ----------
+
+    @classmethod
+    def from_board(cls, board):
+        pos = cls()
+        for square, piece in board.piece_map().items():
+            pos.put_piece(square, piece.piece_type, int(piece.color))
+        pos.turn = int(board.turn)
+        pos.castling = ((WHITE_KINGSIDE if board.has_kingside_castling_rights(chess.WHITE) else 0) |
+                        (WHITE_QUEENSIDE if board.has_queenside_castling_rights(chess.WHITE) else 0) |
+                        (BLACK_KINGSIDE if board.has_kingside_castling_rights(chess.BLACK) else 0) |
+                        (BLACK_QUEENSIDE if board.has_queenside_castling_rights(chess.BLACK) else 0))
+        pos.ep_square = board.ep_square if board.ep_square is not None else -1
+        pos.halfmove_clock = board.halfmove_clock
+        pos.fullmove_number = board.fullmove_number
+        pos.key = pos.compute_key()
+        return pos
+
+    @classmethod
+    def from_fen(cls, fen):
+        return cls.from_board(chess.Board(fen))
+
+    def put_piece(self, square, piece_type, color):
+        bit = 1 << square
+        self.pieces[color][piece_type] |= bit
+        self.occupied_co[color] |= bit
+        self.occupied |= bit
+        self.squares[square] = piece_type | (color << 3)
+        self.mg += MG[color][piece_type][square]
+        self.eg += EG[color][piece_type][square]
+        self.phase += PHASE[piece_type]
+
+    def compute_key(self):
+        """Full polyglot Zobrist key, make() keeps it up to date incrementally"""
+        key = 0
+        for square in range(64):
+            code = self.squares[square]
+            if code:
+                key ^= PIECE_KEYS[code >> 3][code & 7][square]
+        key ^= CASTLING_KEYS[self.castling]
+        if self.ep_square >= 0 and PAWN_ATTACKS[self.turn ^ 1][self.ep_square] & self.pieces[self.turn][PAWN]:
+            key ^= EP_KEYS[self.ep_square & 7]
+        if self.turn:
+            key ^= TURN_KEY
+        return key
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                code = self.squares[rank * 8 + file]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = chess.piece_symbol(code & 7)
+                row += symbol.upper() if code >> 3 else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = ''.join(symbol for bit, symbol in ((WHITE_KINGSIDE, 'K'), (WHITE_QUEENSIDE, 'Q'),
+                                                      (BLACK_KINGSIDE, 'k'), (BLACK_QUEENSIDE, 'q'))
+                           if self.castling & bit) or '-'
+        ep = chess.SQUARE_NAMES[self.ep_square] if self.ep_square >= 0 else '-'
+        return f"{'/'.join(rows)} {'w' if self.turn else 'b'} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    def to_board(self):
+        return chess.Board(self.fen())
+
+    @staticmethod
+    def to_chess_move(move):
+        return chess.Move(move & 63, (move >> 6) & 63, move_promotion(move) or None)
+
+    def from_chess_move(self, chess_move):
+        """Finds the int encoding (with its flag) of a python-chess move in this position, None if it isn't pseudo-legal"""
+        wanted = encode_move(chess_move.from_square, chess_move.to_square, chess_move.promotion or 0)
+        for move in self.generate_moves():
+            if move & 0x7FFF == wanted:
+                return move
+        return None
+
+    # ---------- attacks ----------
+
+    def is_attacked(self, square, by):
+        """True if the given color attacks the square"""
+        pieces = self.pieces[by]
+        if KNIGHT_ATTACKS[square] & pieces[KNIGHT] or KING_ATTACKS[square] & pieces[KING] or \
+                PAWN_ATTACKS[by ^ 1][square] & pieces[PAWN]:
+            return True
+        occupied = self.occupied
+        queens = pieces[QUEEN]
+        if (DIAG_ATTACKS[square][occupied & DIAG_MASKS[square]] |
+                ANTI_ATTACKS[square][occupied & ANTI_MASKS[square]]) & (pieces[BISHOP] | queens):
+            return True
+        return bool((RANK_ATTACKS[square][occupied & RANK_MASKS[square]] |
+                     FILE_ATTACKS[square][occupied & FILE_MASKS[square]]) & (pieces[ROOK] | queens))
+
+    def attackers(self, square, occupied):
+        """Bitboard of pieces of both colors attacking a square, given an occupancy"""
+        white = self.pieces[WHITE]
+        black = self.pieces[BLACK]
+        diagonal = bishop_attacks(square, occupied)
+        straight = rook_attacks(square, occupied)
+        return ((KNIGHT_ATTACKS[square] & (white[KNIGHT] | black[KNIGHT])) |
+                (KING_ATTACKS[square] & (white[KING] | black[KING])) |
+                (PAWN_ATTACKS[BLACK][square] & white[PAWN]) |
+                (PAWN_ATTACKS[WHITE][square] & black[PAWN]) |
+                (diagonal & (white[BISHOP] | black[BISHOP] | white[QUEEN] | black[QUEEN])) |
+                (straight & (white[ROOK] | black[ROOK] | white[QUEEN] | black[QUEEN]))) & occupied
+
+    def see(self, move):
+        """
+        Static exchange evaluation of a capture, nothing is played on the board.
+        Both sides keep recapturing on the target square with their least valuable attacker, sliders behind
+        a piece that captured join in, and either side may stop when recapturing would lose material.
+        @return: material won by the side to move in centipawns, negative for a losing capture
+        """
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        squares = self.squares
+        attacker = squares[from_square] & 7
+        occupied = self.occupied ^ (1 << from_square)
+        if move >> 15 == FLAG_EP:
+            gain = SEE_VALUES[PAWN]
+            occupied ^= 1 << (to_square - 8 if self.turn else to_square + 8)
+        else:
+            gain = SEE_VALUES[squares[to_square] & 7]
+        if promotion:
+            gain += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+            attacker = promotion
+        gains = [gain]
+        side = self.turn ^ 1
+        pieces = self.pieces
+        attackers = self.attackers(to_square, occupied)
+        while True:
+            ours = attackers & self.occupied_co[side]
+            if not ours:
+                break
+            for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+                bits = ours & pieces[side][piece_type]
+                if bits:
+                    break
+            gains.append(SEE_VALUES[attacker] - gains[-1])  # take the last capturer
+            attacker = piece_type
+            occupied ^= bits & -bits
+            attackers = self.attackers(to_square, occupied)  # uncovers x-ray attackers behind the capturer
+            side ^= 1
+        while len(gains) > 1:  # each side only continues the exchange if it pays
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+
+    def king_square(self, color):
+        return self.pieces[color][KING].bit_length() - 1
+
+    def in_check(self):
+        return self.is_attacked(self.pieces[self.turn][KING].bit_length() - 1, self.turn ^ 1)
+
+    def piece_attacks(self, piece_type, square, color):
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[square]
+        if piece_type == BISHOP:
+            return bishop_attacks(square, self.occupied)
+        if piece_type == ROOK:
+            return rook_attacks(square, self.occupied)
+        if piece_type == QUEEN:
+            return bishop_attacks(square, self.occupied) | rook_attacks(square, self.occupied)
+        if piece_type == KING:
+            return KING_ATTACKS[square]
+        return PAWN_ATTACKS[color][square]
+
+    # ---------- move generation ----------
+
+    def generate_moves(self):
+        return self.generate_noisy() + self.generate_quiets()
+
+    def generate_noisy(self):
+        """Pseudo-legal captures, en passant and promotions"""
+        moves = []
+        append = moves.append
+        us = self.turn
+        them = us ^ 1
+        our = self.pieces[us]
+        enemies = self.occupied_co[them]
+        occupied = self.occupied
+        empty = ~occupied & BB_ALL
+
+        # pawns
+        pawns = our[PAWN]
+        if us:
+            single = (pawns << 8) & empty & BB_RANK_8
+            left = ((pawns & ~BB_FILE_A) << 7) & enemies
+            right = ((pawns & ~BB_FILE_H) << 9) & enemies
+            push, left_delta, right_delta = 8, 7, 9
+        else:
+            single = (pawns >> 8) & empty & BB_RANK_1
+            left = ((pawns & ~BB_FILE_A) >> 9) & enemies
+            right = ((pawns & ~BB_FILE_H) >> 7) & enemies
+            push, left_delta, right_delta = -8, -9, -7
+        for targets, delta in ((left, left_delta), (right, right_delta), (single, push)):
+            while targets:
+                bit = targets & -targets
+                to_square = bit.bit_length() - 1
+                targets ^= bit
+                from_square = to_square - delta
+                if bit & BB_PROMOTION_RANKS:
+                    for promotion in PROMOTION_TYPES:
+                        append(from_square | (to_square << 6) | (promotion << 12))
+                else:
+                    append(from_square | (to_square << 6))
+        if self.ep_square >= 0:
+            capturers = PAWN_ATTACKS[them][self.ep_square] & pawns
+            while capturers:
+                bit = capturers & -capturers
+                capturers ^= bit
+                append((bit.bit_length() - 1) | (self.ep_square << 6) | (FLAG_EP << 15))
+
+        self._piece_moves(append, enemies)
+        return moves
+
+    def generate_quiets(self):
+        """Pseudo-legal non-capturing moves, without promotions"""
+        moves = []
+        append = moves.append
+        us = self.turn
+        our = self.pieces[us]
+        occupied = self.occupied
+        empty = ~occupied & BB_ALL
+
+        pawns = our[PAWN]
+        if us:
+            single = (pawns << 8) & empty & ~BB_RANK_8
+            double = ((single & BB_RANK_3) << 8) & empty
+            push = 8
+        else:
+            single = (pawns >> 8) & empty & ~BB_RANK_1
+            double = ((single & BB_RANK_6) >> 8) & empty
+            push = -8
+        while single:
+            bit = single & -single
+            to_square = bit.bit_length() - 1
+            single ^= bit
+            append((to_square - push) | (to_square << 6))
+        while double:
+            bit = double & -double
+            to_square = bit.bit_length() - 1
+            double ^= bit
+            append((to_square - 2 * push) | (to_square << 6) | (FLAG_DOUBLE << 15))
+
+        self._piece_moves(append, empty)
+        self._castling_moves(append)
+        return moves
+
+    def _piece_moves(self, append, targets):
+        """Knight, bishop, rook, queen and king moves onto the target squares"""
+        our = self.pieces[self.turn]
+        occupied = self.occupied
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            pieces = our[piece_type]
+            while pieces:
+                bit = pieces & -pieces
+                from_square = bit.bit_length() - 1
+                pieces ^= bit
+                if piece_type == KNIGHT:
+                    attacks = KNIGHT_ATTACKS[from_square]
+                elif piece_type == KING:
+                    attacks = KING_ATTACKS[from_square]
+                else:
+                    attacks = 0
+                    if piece_type != ROOK:
+                        attacks = DIAG_ATTACKS[from_square][occupied & DIAG_MASKS[from_square]] | \
+                            ANTI_ATTACKS[from_square][occupied & ANTI_MASKS[from_square]]
+                    if piece_type != BISHOP:
+                        attacks |= RANK_ATTACKS[from_square][occupied & RANK_MASKS[from_square]] | \
+                            FILE_ATTACKS[from_square][occupied & FILE_MASKS[from_square]]
+                attacks &= targets
+                while attacks:
+                    to_bit = attacks & -attacks
+                    attacks ^= to_bit
+                    append(from_square | ((to_bit.bit_length() - 1) << 6))
+
+    def _castling_moves(self, append):
+        """Castling with empty squares in between and no attacked square on the king's path"""
+        castling = self.castling
+        if not castling:
+            return
+        occupied = self.occupied
+        if self.turn:
+            if castling & WHITE_KINGSIDE and not occupied & (chess.BB_F1 | chess.BB_G1) and \
+                    not self.is_attacked(chess.E1, BLACK) and not self.is_attacked(chess.F1, BLACK):
+                append(CASTLE_WK)
+            if castling & WHITE_QUEENSIDE and not occupied & (chess.BB_B1 | chess.BB_C1 | chess.BB_D1) and \
+                    not self.is_attacked(chess.E1, BLACK) and not self.is_attacked(chess.D1, BLACK):
+                append(CASTLE_WQ)
+        else:
+            if castling & BLACK_KINGSIDE and not occupied & (chess.BB_F8 | chess.BB_G8) and \
+                    not self.is_attacked(chess.E8, WHITE) and not self.is_attacked(chess.F8, WHITE):
+                append(CASTLE_BK)
+            if castling & BLACK_QUEENSIDE and not occupied & (chess.BB_B8 | chess.BB_C8 | chess.BB_D8) and \
+                    not self.is_attacked(chess.E8, WHITE) and not self.is_attacked(chess.D8, WHITE):
+                append(CASTLE_BQ)
+
+    def generate_legal_moves(self):
+        """Fully legal moves, for the root and for tools, the search filters lazily through make()"""
+        legal = []
+        for move in self.generate_moves():
+            if self.make(move):
+                self.unmake()
+                legal.append(move)
+        return legal
+
+    def is_noisy(self, move):
+        return bool(self.squares[(move >> 6) & 63] or (move >> 12) & 7 or move >> 15 == FLAG_EP)
+
+    def is_pseudo_legal(self, move):
+        """Checks a move from the transposition table or killer slots before it is played"""
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flag = move >> 15
+        us = self.turn
+        code = self.squares[from_square]
+        if not code or code >> 3 != us:
+            return False
+        target = self.squares[to_square]
+        if target and target >> 3 == us:
+            return False
+        piece_type = code & 7
+        to_bit = 1 << to_square
+        if flag == FLAG_CASTLE:
+            moves = []
+            self._castling_moves(moves.append)
+            return move in moves
+        if piece_type == PAWN:
+            push = 8 if us else -8
+            if bool(promotion) != bool(to_bit & BB_PROMOTION_RANKS):
+                return False
+            if flag == FLAG_EP:
+                return to_square == self.ep_square and bool(PAWN_ATTACKS[us][from_square] & to_bit)
+            if flag == FLAG_DOUBLE:
+                start_rank = 1 if us else 6
+                return from_square >> 3 == start_rank and to_square == from_square + 2 * push and \
+                    not self.squares[from_square + push] and not target
+            if target:
+                return bool(PAWN_ATTACKS[us][from_square] & to_bit)
+            return to_square == from_square + push
+        if promotion or flag:
+            return False
+        return bool(self.piece_attacks(piece_type, from_square, us) & to_bit)
+
+    # ---------- make / unmake ----------
+
+    def make(self, move):
+        """
+        Plays a pseudo-legal move
+        @return: False (with the move already taken back) if it leaves the mover's king in check
+        """
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flag = move >> 15
+        us = self.turn
+        them = us ^ 1
+        squares = self.squares
+        our = self.pieces[us]
+        their = self.pieces[them]
+        occupied_co = self.occupied_co
+        piece_type = squares[from_square] & 7
+        captured = squares[to_square]
+        self.history.append((move, captured, self.castling, self.ep_square, self.halfmove_clock,
+                             self.key, self.mg, self.eg, self.phase))
+
+        key = self.key ^ TURN_KEY ^ CASTLING_KEYS[self.castling]
+        if self.ep_square >= 0 and PAWN_ATTACKS[them][self.ep_square] & our[PAWN]:
+            key ^= EP_KEYS[self.ep_square & 7]
+        our_keys = PIECE_KEYS[us]
+        our_mg = MG[us]
+        our_eg = EG[us]
+        mg = self.mg
+        eg = self.eg
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+
+        if captured:
+            captured_type = captured & 7
+            their[captured_type] ^= to_bit
+            occupied_co[them] ^= to_bit
+            key ^= PIECE_KEYS[them][captured_type][to_square]
+            mg -= MG[them][captured_type][to_square]
+            eg -= EG[them][captured_type][to_square]
+            self.phase -= PHASE[captured_type]
+
+        move_bits = from_bit | to_bit
+        our[piece_type] ^= move_bits
+        occupied_co[us] ^= move_bits
+        squares[from_square] = 0
+        squares[to_square] = piece_type | (us << 3)
+        key ^= our_keys[piece_type][from_square] ^ our_keys[piece_type][to_square]
+        mg += our_mg[piece_type][to_square] - our_mg[piece_type][from_square]
+        eg += our_eg[piece_type][to_square] - our_eg[piece_type][from_square]
+
+        self.ep_square = -1
+        if flag:
+            if flag == FLAG_EP:
+                captured_square = to_square - 8 if us else to_square + 8
+                captured_bit = 1 << captured_square
+                their[PAWN] ^= captured_bit
+                occupied_co[them] ^= captured_bit
+                squares[captured_square] = 0
+                key ^= PIECE_KEYS[them][PAWN][captured_square]
+                mg -= MG[them][PAWN][captured_square]
+                eg -= EG[them][PAWN][captured_square]
+            elif flag == FLAG_DOUBLE:
+                ep_square = (from_square + to_square) >> 1
+                self.ep_square = ep_square
+                if PAWN_ATTACKS[us][ep_square] & their[PAWN]:
+                    key ^= EP_KEYS[ep_square & 7]
+            else:  # castling, move the rook too
+                rook_from, rook_to = CASTLING_ROOKS[to_square]
+                rook_bits = (1 << rook_from) | (1 << rook_to)
+                our[ROOK] ^= rook_bits
+                occupied_co[us] ^= rook_bits
+                squares[rook_from] = 0
+                squares[rook_to] = ROOK | (us << 3)
+                key ^= our_keys[ROOK][rook_from] ^ our_keys[ROOK][rook_to]
+                mg += our_mg[ROOK][rook_to] - our_mg[ROOK][rook_from]
+                eg += our_eg[ROOK][rook_to] - our_eg[ROOK][rook_from]
+
+        if promotion:
+            our[PAWN] ^= to_bit
+            our[promotion] |= to_bit
+            squares[to_square] = promotion | (us << 3)
+            key ^= our_keys[PAWN][to_square] ^ our_keys[promotion][to_square]
+            mg += our_mg[promotion][to_square] - our_mg[PAWN][to_square]
+            eg += our_eg[promotion][to_square] - our_eg[PAWN][to_square]
+            self.phase += PHASE[promotion]
+
+        castling = self.castling & CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+        self.castling = castling
+        key ^= CASTLING_KEYS[castling]
+
+        if piece_type == PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not us:
+            self.fullmove_number += 1
+        self.occupied = occupied_co[0] | occupied_co[1]
+        self.turn = them
+        self.key = key
+        self.mg = mg
+        self.eg = eg
+
+        if self.is_attacked(our[KING].bit_length() - 1, them):
+            self.unmake()
+            return False
+        return True
+
+    def unmake(self):
+        move, captured, self.castling, self.ep_square, self.halfmove_clock, self.key, self.mg, self.eg, \
+            self.phase = self.history.pop()
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flag = move >> 15
+        them = self.turn
+        us = them ^ 1
+        self.turn = us
+        squares = self.squares
+        our = self.pieces[us]
+        their = self.pieces[them]
+        occupied_co = self.occupied_co
+        to_bit = 1 << to_square
+
+        if promotion:
+            our[promotion] ^= to_bit
+            our[PAWN] |= to_bit
+            piece_type = PAWN
+        else:
+            piece_type = squares[to_square] & 7
+        move_bits = (1 << from_square) | to_bit
+        our[piece_type] ^= move_bits
+        occupied_co[us] ^= move_bits
+        squares[from_square] = piece_type | (us << 3)
+        squares[to_square] = captured
+        if captured:
+            their[captured & 7] |= to_bit
+            occupied_co[them] |= to_bit
+
+        if flag == FLAG_EP:
+            captured_square = to_square - 8 if us else to_square + 8
+            captured_bit = 1 << captured_square
+            their[PAWN] |= captured_bit
+            occupied_co[them] |= captured_bit
+            squares[captured_square] = PAWN | (them << 3)
+        elif flag == FLAG_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_square]
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            our[ROOK] ^= rook_bits
+            occupied_co[us] ^= rook_bits
+            squares[rook_to] = 0
+            squares[rook_from] = ROOK | (us << 3)
+
+        if not us:
+            self.fullmove_number -= 1
+        self.occupied = occupied_co[0] | occupied_co[1]
+
+    def make_null(self):
+        """Passes the turn without moving, for null-move pruning. Never call it while in check"""
+        self.history.append((0, 0, self.castling, self.ep_square, self.halfmove_clock,
+                             self.key, self.mg, self.eg, self.phase))
+        key = self.key ^ TURN_KEY
+        if self.ep_square >= 0 and PAWN_ATTACKS[self.turn ^ 1][self.ep_square] & self.pieces[self.turn][PAWN]:
+            key ^= EP_KEYS[self.ep_square & 7]
+        self.key = key
+        self.ep_square = -1
+        self.halfmove_clock = 0  # repetition checks don't look back past a null move
+        self.turn ^= 1
+
+    def unmake_null(self):
+        _, _, self.castling, self.ep_square, self.halfmove_clock, self.key, self.mg, self.eg, \
+            self.phase = self.history.pop()
+        self.turn ^= 1
+
+    # ---------- draws and evaluation ----------
+
+    def is_repetition(self):
+        """True if the current position occurred before since the last capture or pawn move"""
+        history = self.history
+        key = self.key
+        stop = max(len(history) - self.halfmove_clock, 0)
+        for i in range(len(history) - 2, stop - 1, -2):
+            if history[i][5] == key:
+                return True
+        return False
+
+    def is_fifty_moves(self):
+        return self.halfmove_clock >= 100
+
+    def evaluate(self):
+        """Tapered material and piece-square score in centipawns for the side to move, evaluation.tapered() inlined"""
+        phase = self.phase if self.phase < MAX_PHASE else MAX_PHASE
+        score = (self.mg * phase + self.eg * (MAX_PHASE - phase)) // MAX_PHASE
+        return score if self.turn else -score
@@ -0,0 +1,92 @@
+import mmap
+import os
+import random
+import struct
+
+import chess
+
+from engines import zobrist
+
+ENTRY = struct.Struct(">QHHI")  # key, move, weight, learn
+KEY = struct.Struct(">Q")
+# polyglot writes castling as the king capturing its own rook
+CASTLING_MOVES = {(chess.E1, chess.H1): chess.G1, (chess.E1, chess.A1): chess.C1,
+                  (chess.E8, chess.H8): chess.G8, (chess.E8, chess.A8): chess.C8}
+
+
+class OpeningBook:
+    def __init__(self, path, mode='weighted', seed=None):
+        """
+        Polyglot .bin opening book, read through mmap.
+        Entries are sorted by Zobrist key, so a lookup is a binary search over the file and nothing is loaded up front.
+        @param mode: 'weighted' picks a book move at random in proportion to its weight, 'best' always plays the
+        highest weighted one
+        """
+        if mode not in ('weighted', 'best'):
+            raise ValueError(f"unknown book mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.rng = random.Random(seed)
+        size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None  # can't map 0 bytes
+        self.num_entries = size // ENTRY.size
+
+    def entries(self, key):
+        """All (move, weight) pairs stored for a key, move still in raw polyglot encoding"""
+        if self.mm is None:
+            return []
+        low, high = 0, self.num_entries
+        while low < high:  # first entry with a key >= the one we want
+            mid = (low + high) // 2
+            if KEY.unpack_from(self.mm, mid * ENTRY.size)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        found = []
+        for index in range(low, self.num_entries):
+            entry_key, raw_move, weight, _ = ENTRY.unpack_from(self.mm, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((raw_move, weight))
+        return found
+
+    @staticmethod
+    def decode_move(board, raw_move):
+        to_square = raw_move & 0x3F
+        from_square = (raw_move >> 6) & 0x3F
+        promotion = (raw_move >> 12) & 0x7
+        if board.piece_type_at(from_square) == chess.KING:
+            to_square = CASTLING_MOVES.get((from_square, to_square), to_square)
+        return chess.Move(from_square, to_square, promotion + 1 if promotion else None)
+
+    def pick(self, board, key=None):
+        """
+        @param key: Zobrist key of the board if the caller already has it
+        @return: a legal book move for the position, or None when the book has nothing
+        """
+        if key is None:
+            key = zobrist.hash_board(board)
+        candidates = []
+        for raw_move, weight in self.entries(key):
+            move = self.decode_move(board, raw_move)
+            if board.is_legal(move):
+                candidates.append((move, weight))
+        if not candidates:
+            return None
+        if self.mode == 'best':
+            return max(candidates, key=lambda candidate: candidate[1])[0]
+        total = sum(weight for _, weight in candidates)
+        if total == 0:
+            return self.rng.choice(candidates)[0]
+        choice = self.rng.uniform(0, total)
+        for move, weight in candidates:
+            choice -= weight
+            if choice <= 0:
+                return move
+        return candidates[-1][0]
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
@@ -0,0 +1,112 @@
+import chess
+
+# material in centipawns, middlegame and endgame
+mg_values = {1: 82, 2: 337, 3: 365, 4: 477, 5: 1025, 6: 0}
+eg_values = {1: 94, 2: 281, 3: 297, 4: 512, 5: 936, 6: 0}
+# how much each piece counts towards the middlegame, a full board adds up to 24
+phase_weights = {1: 0, 2: 1, 3: 1, 4: 2, 5: 4, 6: 0}
+MAX_PHASE = 24
+
+# piece-square tables from white's point of view, written with rank 8 on top so they read like a board
+# (flip with square ^ 56 to index by a python-chess square)
+PAWN_MG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0]
+PAWN_EG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+    120, 120, 120, 120, 120, 120, 120, 120,
+     70,  70,  70,  70,  70,  70,  70,  70,
+     40,  40,  40,  40,  40,  40,  40,  40,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0]
+KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+ROOK = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0]
+QUEEN = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20]
+KING_MG = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20]
+KING_EG = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50]
+
+mg_tables = {1: PAWN_MG, 2: KNIGHT, 3: BISHOP, 4: ROOK, 5: QUEEN, 6: KING_MG}
+eg_tables = {1: PAWN_EG, 2: KNIGHT, 3: BISHOP, 4: ROOK, 5: QUEEN, 6: KING_EG}
+
+
+def _square_scores(values, tables):
+    """Material plus piece-square bonus, signed from white's point of view: [color][piece_type][square]"""
+    scores = {chess.WHITE: {}, chess.BLACK: {}}
+    for piece_type in chess.PIECE_TYPES:
+        table = tables[piece_type]
+        scores[chess.WHITE][piece_type] = [values[piece_type] + table[square ^ 56] for square in chess.SQUARES]
+        scores[chess.BLACK][piece_type] = [-(values[piece_type] + table[square]) for square in chess.SQUARES]
+    return scores
+
+
+MG_SCORES = _square_scores(mg_values, mg_tables)
+EG_SCORES = _square_scores(eg_values, eg_tables)
+
+
+def tapered(mg, eg, phase, turn):
+    """
+    Blends middlegame and endgame totals by game phase, the full board counts as pure middlegame
+    @param mg, eg: material and piece-square sums from white's point of view, see MG_SCORES and EG_SCORES
+    @param phase: sum of phase_weights of the pieces on the board
+    @return: score in centipawns from the point of view of the side to move
+    """
+    phase = min(phase, MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if turn else -score
@@ -0,0 +1,109 @@
+import random
+
+from engines.bitboard import PAWN, FLAG_EP
+
+# Pawn: chess.PAWN (1)
+# Knight: chess.KNIGHT (2)
+# Bishop: chess.BISHOP (3)
+# Rook: chess.ROOK (4)
+# Queen: chess.QUEEN (5)
+# King: chess.KING (6)
+mvv_lva_values = [0, 1, 3, 3, 5, 9, 100]
+MAX_PLY = 128
+PERTURBATION = 16  # largest random bonus added to quiet history scores by a seeded orderer
+
+
+class MoveOrderer:
+    def __init__(self, seed=None):
+        """
+        Staged move ordering for alpha-beta search over a bitboard Position, moves come out in the order
+        hash move, captures and promotions by MVV-LVA, killer moves, quiet moves by history score.
+        Later stages are only generated if the earlier ones didn't cause a cutoff.
+        Moves are pseudo-legal, the search drops illegal ones when Position.make() rejects them.
+        Any object with order(), order_noisy(), record_cutoff() and new_search() can be passed to the engine instead.
+        @param seed: perturbs the order of quiet moves randomly, so parallel search workers explore different trees
+        """
+        self.rng = random.Random(seed) if seed is not None else None
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]  # [color][from | to << 6]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, pos, ply, hash_move=None):
+        """
+        Yields the pseudo-legal moves of a position, best candidates first
+        @param ply: distance from the root, killer moves are stored per ply
+        @param hash_move: best move from the transposition table or the previous iteration
+        """
+        if hash_move and pos.is_pseudo_legal(hash_move):
+            yield hash_move
+        else:
+            hash_move = 0
+
+        # captures and promotions, most valuable victim first, then least valuable attacker
+        for move in self.order_noisy(pos):
+            if move != hash_move:
+                yield move
+
+        # killers, quiet moves that caused a cutoff at this ply in a sibling node
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        for killer in killers:
+            if killer and killer != hash_move and not pos.is_noisy(killer) and pos.is_pseudo_legal(killer):
+                yield killer
+
+        # quiet moves by history score
+        history = self.history[pos.turn]
+        quiets = [(history[move & 4095], move) for move in pos.generate_quiets()
+                  if move != hash_move and move != killers[0] and move != killers[1]]
+        if self.rng is not None:
+            randrange = self.rng.randrange
+            quiets = [(score + randrange(PERTURBATION), move) for score, move in quiets]
+        quiets.sort(reverse=True)
+        for _, move in quiets:
+            yield move
+
+    @staticmethod
+    def order_noisy(pos):
+        """Captures and promotions only, sorted by MVV-LVA, used on its own by quiescence search"""
+        squares = pos.squares
+        noisy = []
+        for move in pos.generate_noisy():
+            victim = squares[(move >> 6) & 63] & 7
+            if not victim and move >> 15 == FLAG_EP:
+                victim = PAWN
+            score = 10 * mvv_lva_values[victim] - mvv_lva_values[squares[move & 63] & 7]
+            score += 10 * mvv_lva_values[(move >> 12) & 7]  # promotion piece
+            noisy.append((score, move))
+        noisy.sort(reverse=True)
+        return [move for _, move in noisy]
+
+    def record_cutoff(self, pos, move, ply, depth, move_number):
+        """
+        Called when a move fails high, pos must be the position the move was played from
+        @param depth: remaining depth of the node, deeper cutoffs weigh more in the history table
+        @param move_number: index of the move in the ordering, 0 if the first move caused the cutoff
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if pos.is_noisy(move):
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[pos.turn][move & 4095] += depth * depth
+
+    def new_search(self):
+        """Halves history scores and clears killers before a new root search, so old results fade out"""
+        for color_table in self.history:
+            for index in range(4096):
+                color_table[index] >>= 1
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def first_move_cutoff_rate(self):
+        """Fraction of cutoffs caused by the first move searched, a measure of ordering quality"""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
@@ -0,0 +1,86 @@
+from engines import zobrist
+
+
+class RepetitionTracker:
+    def __init__(self, board=None):
+        """
+        Zobrist keys of the positions of a game, kept as a stack parallel to the board's move stack.
+        Positions only repeat back to the last capture or pawn move, so lookups stop there.
+        Engines push()/pop() moves they try during a search, the game calls sync() after moves were made
+        on the board directly.
+        """
+        self.keys = []
+        self.clocks = []  # halfmove clock of every position, how far back a repetition can be
+        self.moves = []  # move that led to every position but the first, to tell whether a board is still this game
+        self.board = None  # board the stack was last synced with
+        if board is not None:
+            self.reset(board)
+
+    def reset(self, board):
+        """Rebuilds the stack from the start of the board's game"""
+        root = board.root()
+        self.keys = [zobrist.hash_board(root)]
+        self.clocks = [root.halfmove_clock]
+        self.moves = []
+        self.board = board
+        for move in board.move_stack:
+            self.push(root, move)
+            root.push(move)
+
+    def push(self, board, move):
+        """Records the position after move, call it before the move is pushed on the board"""
+        self.keys.append(zobrist.update(board, self.keys[-1], move))
+        self.clocks.append(0 if board.is_zeroing(move) else self.clocks[-1] + 1)
+        self.moves.append(move)
+
+    def pop(self):
+        self.keys.pop()
+        self.clocks.pop()
+        self.moves.pop()
+
+    def sync(self, board):
+        """
+        Catches up with moves pushed or popped on the board without going through the tracker.
+        The usual case, the same board a move or two ahead, is updated incrementally. The board is only hashed
+        in full when it's another board object or the moves no longer match, and rebuilt if that's a new game.
+        A board reset or set to a FEN in place needs reset(), as Game.restart() does
+        """
+        ply = len(board.move_stack)
+        known = min(len(self.keys) - 1, ply)  # plies the stack and the board share if it's the same game
+        if board is self.board and known > 0 and board.move_stack[known - 1] == self.moves[known - 1]:
+            del self.keys[known + 1:]
+            del self.clocks[known + 1:]
+            del self.moves[known:]
+            if known < ply:
+                # step the board itself back and forth, a copy would duplicate the whole move stack every ply
+                missed = [board.pop() for _ in range(ply - known)][::-1]
+                for move in missed:
+                    self.push(board, move)
+                    board.push(move)
+            return
+        if len(self.keys) != ply + 1 or self.keys[-1] != zobrist.hash_board(board):  # a different game, start over
+            self.reset(board)
+        self.board = board
+
+    @property
+    def key(self):
+        return self.keys[-1]
+
+    def count(self):
+        """Number of times the current position occurred, itself included"""
+        keys = self.keys
+        key = keys[-1]
+        stop = max(len(keys) - 1 - self.clocks[-1], 0)
+        count = 1
+        for i in range(len(keys) - 3, stop - 1, -2):  # same side to move only
+            if keys[i] == key:
+                count += 1
+        return count
+
+    def is_repetition(self, count=3):
+        return self.count() >= count
+
+    def reversible_keys(self):
+        """Keys of the earlier positions that the current one could still repeat"""
+        stop = max(len(self.keys) - 1 - self.clocks[-1], 0)
+        return frozenset(self.keys[stop:-1])
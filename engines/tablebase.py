@@ -0,0 +1,465 @@
+import argparse
+import mmap
+import os
+import time
+from array import array
+from itertools import product
+
+from engines.bitboard import (KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks,
+                              PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK)
+
+# strong side pieces besides the king, in the order they are indexed; the weak side only has its king
+SIGNATURES = {
+    'KQK': (QUEEN,),
+    'KRK': (ROOK,),
+    'KPK': (PAWN,),
+    'KBNK': (BISHOP, KNIGHT),
+}
+# tables a signature's positions can convert into, which have to be generated first
+DEPENDENCIES = {'KPK': ('KQK', 'KRK')}
+MAX_PIECES = 4
+TABLEBASE_DIR = 'tablebases'
+
+# one byte per position: 0 draw, 255 broken position, otherwise plies to mate + 1.
+# only the strong side can win these endings, so the side to move tells a win from a loss
+DRAW = 0
+ILLEGAL = 255
+
+# stm part of the index, who is to move
+STRONG = 0
+WEAK = 1
+
+
+def _transform_tables():
+    """
+    For every square of the strong king, the square mapping that brings it into the canonical region.
+    Pawnless endings use all 8 board symmetries (king into the a1-d1-d4 triangle),
+    endings with pawns only the left-right mirror (king onto files a-d).
+    """
+    identity = list(range(64))
+    pawnless = []
+    pawns = []
+    for king in range(64):
+        table = identity
+        if king & 7 > 3:
+            table = [square ^ 7 for square in table]
+        pawns.append(table)
+        if table[king] >> 3 > 3:
+            table = [square ^ 56 for square in table]
+        if table[king] >> 3 > table[king] & 7:
+            table = [((square & 7) << 3) | (square >> 3) for square in table]
+        pawnless.append(table)
+    return pawnless, pawns
+
+
+PAWNLESS_TRANSFORMS, PAWN_TRANSFORMS = _transform_tables()
+TRIANGLE = [square for square in range(64) if (square & 7) <= 3 and (square >> 3) <= (square & 7)]
+PAWNLESS_KING_INDEX = {square: i for i, square in enumerate(TRIANGLE)}
+PAWN_KING_SQUARES = [square for square in range(64) if square & 7 <= 3]
+PAWN_KING_INDEX = {square: i for i, square in enumerate(PAWN_KING_SQUARES)}
+
+
+def piece_attacks(piece_type, square, occupied):
+    """Squares a strong side piece attacks"""
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[WHITE][square]
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece_type == BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(square, occupied)
+    if piece_type == QUEEN:
+        return bishop_attacks(square, occupied) | rook_attacks(square, occupied)
+    return KING_ATTACKS[square]
+
+
+class TableLayout:
+    def __init__(self, signature):
+        """Maps (side to move, strong king, weak king, strong pieces) to a position index and back"""
+        self.signature = signature
+        self.piece_types = SIGNATURES[signature]
+        self.has_pawns = PAWN in self.piece_types
+        if self.has_pawns:
+            self.transforms = PAWN_TRANSFORMS
+            self.king_squares = PAWN_KING_SQUARES
+            self.king_index = PAWN_KING_INDEX
+        else:
+            self.transforms = PAWNLESS_TRANSFORMS
+            self.king_squares = TRIANGLE
+            self.king_index = PAWNLESS_KING_INDEX
+        self.per_stm = len(self.king_squares) * 64 ** (1 + len(self.piece_types))
+        self.size = 2 * self.per_stm
+
+    def index(self, stm, strong_king, weak_king, pieces):
+        """
+        Index of a position, the squares don't need to be canonical.
+        Every symmetric copy of a position gets the same index: with the strong king on the a1-h8 diagonal
+        the transposed copy is still in the triangle, so the smaller of the two square lists is used.
+        """
+        table = self.transforms[strong_king]
+        king = table[strong_king]
+        squares = [table[weak_king]] + [table[square] for square in pieces]
+        if not self.has_pawns and king >> 3 == king & 7:
+            transposed = [((square & 7) << 3) | (square >> 3) for square in squares]
+            if transposed < squares:
+                squares = transposed
+        index = stm * len(self.king_squares) + self.king_index[king]
+        for square in squares:
+            index = index * 64 + square
+        return index
+
+    def decode(self, index):
+        pieces = []
+        for _ in self.piece_types:
+            pieces.append(index & 63)
+            index >>= 6
+        pieces.reverse()
+        weak_king = index & 63
+        index >>= 6
+        stm, king = divmod(index, len(self.king_squares))
+        return stm, self.king_squares[king], weak_king, pieces
+
+
+class TablebaseGenerator:
+    def __init__(self, signature, directory=TABLEBASE_DIR, verbose=True):
+        """
+        Retrograde analysis of one small endgame, strong side always white.
+        Starts from the checkmates and works backwards one ply at a time: a strong side position is won as soon as
+        one move reaches a lost weak side position, a weak side position is lost once every move reaches a won one.
+        Because of that ordering the first ply a position is solved at is its distance to mate.
+        """
+        self.signature = signature
+        self.layout = TableLayout(signature)
+        self.directory = directory
+        self.verbose = verbose
+        self.values = bytearray(self.layout.size)
+        # weak side positions: distinct canonical children not yet known to be lost for it, -1 if it can escape
+        self.counters = array('b', bytes(self.layout.size // 2))
+        self.subtables = {}
+
+    def log(self, message):
+        if self.verbose:
+            print(f"[{self.signature}] {message}")
+
+    def generate(self):
+        start = time.time()
+        for dependency in DEPENDENCIES.get(self.signature, ()):
+            self.subtables[dependency] = Tablebases(self.directory).table(dependency)
+            if self.subtables[dependency] is None:
+                raise FileNotFoundError(f"{self.signature} needs the {dependency} table, generate it first")
+        seeds = self.initialize()
+        self.log(f"initialized {self.layout.size} positions in {time.time() - start:.1f}s")
+        self.retrograde(seeds)
+        self.log(f"solved in {time.time() - start:.1f}s, longest mate {max(v for v in self.values if v != ILLEGAL) - 1} plies")
+        return self.values
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.signature}.bin")
+        with open(path, 'wb') as file:
+            file.write(self.values)
+        return path
+
+    # ---------- position helpers ----------
+
+    def strong_attacks(self, strong_king, pieces, occupied, skip=-1):
+        """Union of the squares the strong side attacks, skip leaves out a piece that was just captured"""
+        attacks = KING_ATTACKS[strong_king]
+        for i, (piece_type, square) in enumerate(zip(self.layout.piece_types, pieces)):
+            if i != skip:
+                attacks |= piece_attacks(piece_type, square, occupied)
+        return attacks
+
+    def is_legal(self, stm, strong_king, weak_king, pieces):
+        squares = {strong_king, weak_king, *pieces}
+        if len(squares) != 2 + len(pieces):
+            return False
+        if KING_ATTACKS[strong_king] & (1 << weak_king):
+            return False
+        for piece_type, square in zip(self.layout.piece_types, pieces):
+            if piece_type == PAWN and (square < 8 or square >= 56):
+                return False
+        if stm == STRONG:  # the weak king can't be in check when it isn't its move
+            occupied = sum(1 << square for square in squares)
+            if self.strong_attacks(strong_king, pieces, occupied) & (1 << weak_king):
+                return False
+        return True
+
+    def weak_moves(self, strong_king, weak_king, pieces):
+        """
+        Legal weak king moves
+        @return: (children, escapes) children are canonical indexes of the strong side to move positions reached
+        without a capture, escapes is True if the king can capture a piece, which draws all of these endings
+        """
+        piece_bits = 0
+        for square in pieces:
+            piece_bits |= 1 << square
+        occupied = piece_bits | (1 << strong_king)  # the weak king is lifted off its square
+        attacked = self.strong_attacks(strong_king, pieces, occupied)
+        children = set()
+        escapes = False
+        targets = KING_ATTACKS[weak_king] & ~KING_ATTACKS[strong_king] & ~(1 << strong_king)
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to_square = bit.bit_length() - 1
+            if bit & piece_bits:
+                captured = pieces.index(to_square)
+                if not self.strong_attacks(strong_king, pieces, occupied, skip=captured) & bit:
+                    escapes = True
+            elif not attacked & bit:
+                children.add(self.layout.index(STRONG, strong_king, to_square, pieces))
+        return children, escapes
+
+    def weak_in_check(self, strong_king, weak_king, pieces):
+        occupied = (1 << strong_king) | (1 << weak_king)
+        for square in pieces:
+            occupied |= 1 << square
+        return bool(self.strong_attacks(strong_king, pieces, occupied) & (1 << weak_king))
+
+    # ---------- initialization ----------
+
+    def initialize(self):
+        """Marks broken positions, checkmates, stalemates and escapes, and counts weak side moves"""
+        layout = self.layout
+        values = self.values
+        counters = self.counters
+        per_stm = layout.per_stm
+        mates = []
+        seeds = {}  # ply -> strong side positions won by promoting into another table
+        index = -1
+        for stm in (STRONG, WEAK):
+            for strong_king in layout.king_squares:
+                for weak_king in range(64):
+                    for pieces in product(range(64), repeat=len(layout.piece_types)):
+                        index += 1  # positions are enumerated in index order
+                        if not self.is_legal(stm, strong_king, weak_king, pieces) or \
+                                layout.index(stm, strong_king, weak_king, pieces) != index:
+                            values[index] = ILLEGAL  # broken, or a symmetric copy stored under another index
+                            continue
+                        if stm == WEAK:
+                            children, escapes = self.weak_moves(strong_king, weak_king, list(pieces))
+                            if escapes:
+                                counters[index - per_stm] = -1
+                            elif children:
+                                counters[index - per_stm] = len(children)
+                            elif self.weak_in_check(strong_king, weak_king, pieces):
+                                mates.append(index)  # checkmate, stalemates stay draws
+                        elif layout.has_pawns:
+                            ply = self.promotion_win(strong_king, weak_king, list(pieces))
+                            if ply is not None:
+                                seeds.setdefault(ply, []).append(index)
+        return mates, seeds
+
+    def promotion_win(self, strong_king, weak_king, pieces):
+        """Shortest win by promoting the pawn into the queen or rook table, None if promoting doesn't win"""
+        pawn = pieces[0]
+        if pawn >> 3 != 6 or (1 << (pawn + 8)) & ((1 << strong_king) | (1 << weak_king)):
+            return None
+        best = None
+        for signature in ('KQK', 'KRK'):
+            result = self.subtables[signature].probe_squares(False, strong_king, weak_king, [pawn + 8])
+            if result is not None and result[0] < 0:  # lost for the weak side to move after the promotion
+                ply = result[1] + 1
+                best = ply if best is None else min(best, ply)
+        return best
+
+    # ---------- retrograde ----------
+
+    def strong_unmoves(self, strong_king, weak_king, pieces):
+        """Strong side to move positions that reach the given weak side to move position with one quiet move"""
+        layout = self.layout
+        occupied = (1 << strong_king) | (1 << weak_king)
+        for square in pieces:
+            occupied |= 1 << square
+        empty = ~occupied
+        origins = KING_ATTACKS[strong_king] & empty & ~KING_ATTACKS[weak_king]
+        while origins:
+            bit = origins & -origins
+            origins ^= bit
+            yield layout.index(STRONG, bit.bit_length() - 1, weak_king, pieces)
+        for i, (piece_type, square) in enumerate(zip(layout.piece_types, pieces)):
+            if piece_type == PAWN:
+                origins = 0
+                if square >= 16 and not occupied & (1 << (square - 8)):
+                    origins |= 1 << (square - 8)
+                    if square >> 3 == 3 and not occupied & (1 << (square - 16)):
+                        origins |= 1 << (square - 16)
+            else:
+                origins = piece_attacks(piece_type, square, occupied) & empty
+            while origins:
+                bit = origins & -origins
+                origins ^= bit
+                moved = list(pieces)
+                moved[i] = bit.bit_length() - 1
+                yield layout.index(STRONG, strong_king, weak_king, moved)
+
+    def weak_unmoves(self, strong_king, weak_king, pieces):
+        """Weak side to move positions that reach the given strong side to move position with one king move"""
+        occupied = (1 << strong_king) | (1 << weak_king)
+        for square in pieces:
+            occupied |= 1 << square
+        origins = KING_ATTACKS[weak_king] & ~occupied & ~KING_ATTACKS[strong_king]
+        while origins:
+            bit = origins & -origins
+            origins ^= bit
+            yield self.layout.index(WEAK, strong_king, bit.bit_length() - 1, pieces)
+
+    def retrograde(self, start):
+        mates, seeds = start
+        layout = self.layout
+        values = self.values
+        counters = self.counters
+        per_stm = layout.per_stm
+        frontier = []
+        for index in mates:
+            values[index] = 1
+            frontier.append(index)
+        ply = 0
+        while frontier or any(p >= ply for p in seeds):
+            next_frontier = []
+            for index in seeds.pop(ply, ()):  # promotions that win at exactly this ply
+                if values[index] == DRAW:
+                    values[index] = ply + 1
+                    frontier.append(index)
+            for index in frontier:
+                stm, strong_king, weak_king, pieces = layout.decode(index)
+                if stm == WEAK:  # lost, every move into it wins for the strong side
+                    for parent in set(self.strong_unmoves(strong_king, weak_king, pieces)):
+                        if values[parent] == DRAW:
+                            values[parent] = ply + 2
+                            next_frontier.append(parent)
+                else:  # won, one more weak side move is known to lose
+                    for parent in set(self.weak_unmoves(strong_king, weak_king, pieces)):
+                        if values[parent] == DRAW and counters[parent - per_stm] > 0:
+                            counters[parent - per_stm] -= 1
+                            if counters[parent - per_stm] == 0:
+                                values[parent] = ply + 2
+                                next_frontier.append(parent)
+            self.log(f"ply {ply}: {len(frontier)} positions")
+            frontier = next_frontier
+            ply += 1
+
+
+class Tablebase:
+    def __init__(self, signature, path):
+        """One generated table, memory-mapped read only"""
+        self.signature = signature
+        self.layout = TableLayout(signature)
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) != self.layout.size:
+            raise ValueError(f"{path} has {len(self.mm)} positions, expected {self.layout.size}")
+
+    def probe_squares(self, strong_to_move, strong_king, weak_king, pieces):
+        """
+        @return: (result, plies to mate) from the side to move's point of view, result 1 win, 0 draw, -1 loss,
+        or None for a broken position
+        """
+        stm = STRONG if strong_to_move else WEAK
+        value = self.mm[self.layout.index(stm, strong_king, weak_king, pieces)]
+        if value == ILLEGAL:
+            return None
+        if value == DRAW:
+            return 0, 0
+        return (1 if strong_to_move else -1), value - 1
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+class Tablebases:
+    def __init__(self, directory=TABLEBASE_DIR):
+        """
+        Probes the generated tables in a directory, tables are opened on first use.
+        Positions are flipped so the strong side is white before looking them up.
+        """
+        self.directory = directory
+        self.tables = {}
+        self.max_pieces = MAX_PIECES
+        self.hits = 0
+
+    def table(self, signature):
+        if signature not in self.tables:
+            path = os.path.join(self.directory, f"{signature}.bin")
+            self.tables[signature] = Tablebase(signature, path) if os.path.exists(path) else None
+        return self.tables[signature]
+
+    def probe(self, pos):
+        """
+        @param pos: bitboard Position
+        @return: (result, plies to mate) for the side to move as in Tablebase.probe_squares, None if no table covers it
+        """
+        occupied = pos.occupied
+        if bin(occupied).count('1') > MAX_PIECES:
+            return None
+        if pos.occupied_co[BLACK] == pos.pieces[BLACK][KING]:
+            strong = WHITE
+        elif pos.occupied_co[WHITE] == pos.pieces[WHITE][KING]:
+            strong = BLACK
+        else:
+            return None
+        pieces = pos.pieces[strong]
+        for signature, piece_types in SIGNATURES.items():
+            squares = []
+            remaining = pos.occupied_co[strong] & ~pieces[KING]
+            for piece_type in piece_types:
+                bits = pieces[piece_type] & remaining
+                if not bits or bits & (bits - 1):
+                    break
+                squares.append(bits.bit_length() - 1)
+                remaining ^= bits
+            else:
+                if remaining:
+                    continue
+                table = self.table(signature)
+                if table is None:
+                    return None
+                flip = 0 if strong == WHITE else 56  # mirror ranks so the strong side plays up the board
+                result = table.probe_squares(pos.turn == strong, (pieces[KING].bit_length() - 1) ^ flip,
+                                             (pos.pieces[strong ^ 1][KING].bit_length() - 1) ^ flip,
+                                             [square ^ flip for square in squares])
+                if result is not None:
+                    self.hits += 1
+                return result
+        return None
+
+    def probe_board(self, board):
+        from engines.bitboard import Position
+        return self.probe(Position.from_board(board))
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+def generate(signatures, directory=TABLEBASE_DIR):
+    """Generates tables in dependency order, skipping ones that already exist"""
+    done = set()
+
+    def build(signature):
+        if signature in done:
+            return
+        for dependency in DEPENDENCIES.get(signature, ()):
+            build(dependency)
+        path = os.path.join(directory, f"{signature}.bin")
+        if not os.path.exists(path):
+            generator = TablebaseGenerator(signature, directory)
+            generator.generate()
+            generator.save()
+        done.add(signature)
+
+    for signature in signatures:
+        build(signature)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis")
+    parser.add_argument('signatures', nargs='*', default=list(SIGNATURES), choices=list(SIGNATURES))
+    parser.add_argument('--dir', default=TABLEBASE_DIR)
+    args = parser.parse_args()
+    generate(args.signatures, args.dir)
@@ -0,0 +1,73 @@
+import json
+import os
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class SearchStats:
+    """What one call to an engine's move() did"""
+    engine: str
+    ply: int  # half moves played before this move
+    move: str  # uci
+    eval: float  # centipawns for the side that moved, None for book moves
+    depth: int  # deepest completed iteration
+    seldepth: int  # deepest ply reached, quiescence included
+    nodes: int
+    qnodes: int
+    nps: float  # nodes and qnodes per second
+    first_move_cutoff_rate: float
+    tt_probes: int
+    tt_hits: int
+    tt_hit_rate: float
+    time: float  # wall time in seconds
+    book: bool = False
+
+
+class Telemetry:
+    def __init__(self, path=None):
+        """
+        Stream of SearchStats records, one per move. Only the current game's records stay in memory,
+        so a long match doesn't grow without bound.
+        @param path: JSON lines file every record is appended to as it comes in, the full history is kept there
+        """
+        self.path = path
+        self.records = []  # the current game's
+
+    def record(self, stats):
+        self.records.append(stats)
+        if self.path is not None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.path, "a") as log_file:
+                log_file.write(json.dumps(asdict(stats)) + "\n")
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def game_records(self):
+        return [stats for stats in self.records if not stats.book]
+
+    def averages(self):
+        """Average time, nodes per second and depth of the searched moves of the current game, None if there were none"""
+        searched = self.game_records()
+        if not searched:
+            return None
+        return {
+            'time': sum(stats.time for stats in searched) / len(searched),
+            'nps': sum(stats.nps for stats in searched) / len(searched),
+            'depth': sum(stats.depth for stats in searched) / len(searched),
+        }
+
+    def new_game(self):
+        """Drops the finished game's records, they're in the file if there is one"""
+        self.records = []
+
+
+def read_records(path):
+    """Loads a JSON lines telemetry file back into SearchStats records"""
+    with open(path) as log_file:
+        return [SearchStats(**json.loads(line)) for line in log_file if line.strip()]
@@ -0,0 +1,167 @@
+import sys
+
+# bound types, how the stored score relates to the true score of the position
+EXACT = 0
+LOWER = 1  # search failed high, true score >= stored score
+UPPER = 2  # search failed low, true score <= stored score
+
+# rough size of one stored entry: list slot, entry tuple, key, score and a share of the move object
+ENTRY_BYTES = 8 + sys.getsizeof((0, 0, 0, 0, 0, 0)) + 36 + 32 + 48
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        """
+        Fixed size transposition table keyed by Zobrist hash.
+        Each bucket has two slots, a depth-preferred slot that keeps the deepest result of the current search and an
+        always-replace slot that takes everything else. Entries are (key, depth, flag, score, move, age) tuples,
+        move is 0 or None when unknown.
+        """
+        self.size_mb = size_mb
+        self.num_buckets = max(1, (size_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        self.table = [None] * (2 * self.num_buckets)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def resize(self, size_mb):
+        """Changes the memory cap, this empties the table"""
+        self.__init__(size_mb)
+
+    def clear(self):
+        self.table = [None] * (2 * self.num_buckets)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """Called before every root search, entries from earlier searches become replaceable"""
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        @param key: Zobrist key of the position
+        @return: (key, depth, flag, score, move, age) entry, or None if the position isn't stored
+        """
+        self.probes += 1
+        index = (key % self.num_buckets) << 1
+        table = self.table
+        entry = table[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = table[index + 1]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = (key % self.num_buckets) << 1
+        table = self.table
+        deep = table[index]
+        # depth-preferred slot: take it if it is empty, stale, the same position or not any deeper
+        if deep is None or deep[0] == key or deep[5] != self.age or depth >= deep[1]:
+            if not move and deep is not None and deep[0] == key:
+                move = deep[4]  # keep the best move of an earlier search of this position
+            table[index] = (key, depth, flag, score, move, self.age)
+        else:
+            table[index + 1] = (key, depth, flag, score, move, self.age)
+
+    def hashfull(self):
+        """Permille of slots filled by the current search, sampled from the first thousand slots"""
+        sample = self.table[:1000]
+        return sum(1 for entry in sample if entry is not None and entry[5] == self.age) * 1000 // len(sample)
+
+
+# packed layout of the data word of a shared entry
+MOVE_BITS = 17
+SCORE_BITS = 24
+DEPTH_BITS = 7
+SCORE_OFFSET = 1 << (SCORE_BITS - 1)
+SCORE_LIMIT = SCORE_OFFSET - 1
+SCORE_SHIFT = MOVE_BITS
+DEPTH_SHIFT = SCORE_SHIFT + SCORE_BITS
+FLAG_SHIFT = DEPTH_SHIFT + DEPTH_BITS
+AGE_SHIFT = FLAG_SHIFT + 2
+SHARED_ENTRY_BYTES = 16
+
+
+class SharedTranspositionTable:
+    def __init__(self, size_mb=16, name=None):
+        """
+        Transposition table in shared memory, for several processes searching the same tree.
+        Same interface and bucket policy as TranspositionTable, but every slot is two 64-bit words:
+        the data word (int move, score, depth, flag, age) and the key XORed with the data word.
+        A slot torn by two processes writing at once no longer matches its key, so it reads as a miss.
+        @param name: attach to the table another process created, None creates a new one
+        """
+        from multiprocessing import shared_memory
+        self.size_mb = size_mb
+        self.num_buckets = max(1, (size_mb * 1024 * 1024) // (2 * SHARED_ENTRY_BYTES))
+        size = 2 * self.num_buckets * SHARED_ENTRY_BYTES
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.name = self.shm.name
+        self.words = self.shm.buf.cast('Q')
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.words.release()
+        self.shm.buf[:] = bytes(self.shm.size)
+        self.words = self.shm.buf.cast('Q')
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        slot = (key % self.num_buckets) << 2
+        for index in (slot, slot + 2):
+            data = words[index + 1]
+            if words[index] ^ data == key:
+                self.hits += 1
+                return (key, (data >> DEPTH_SHIFT) & 0x7F, (data >> FLAG_SHIFT) & 3,
+                        ((data >> SCORE_SHIFT) & 0xFFFFFF) - SCORE_OFFSET, data & 0x1FFFF, data >> AGE_SHIFT)
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        words = self.words
+        slot = (key % self.num_buckets) << 2
+        score = int(max(-SCORE_LIMIT, min(SCORE_LIMIT, score)))
+        deep_data = words[slot + 1]
+        deep_key = words[slot] ^ deep_data
+        # depth-preferred slot: take it if it is empty, stale, the same position or not any deeper
+        if not deep_data or deep_key == key or deep_data >> AGE_SHIFT != self.age or \
+                depth >= (deep_data >> DEPTH_SHIFT) & 0x7F:
+            if not move and deep_key == key:
+                move = deep_data & 0x1FFFF
+            index = slot
+        else:
+            index = slot + 2
+        data = ((move or 0) | (score + SCORE_OFFSET) << SCORE_SHIFT | min(depth, 0x7F) << DEPTH_SHIFT |
+                flag << FLAG_SHIFT | self.age << AGE_SHIFT)
+        words[index] = key ^ data
+        words[index + 1] = data
+
+    def hashfull(self):
+        words = self.words
+        slots = min(1000, len(words) // 2)
+        return sum(1 for i in range(slots) if words[2 * i + 1] and words[2 * i + 1] >> AGE_SHIFT == self.age) \
+            * 1000 // slots
+
+    def close(self):
+        """Detaches from the shared memory, the creating process also frees it"""
+        if self.words is None:  # already closed
+            return
+        self.words.release()
+        self.words = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -5,7 +5,8 @@ class v1_Random:
     def __init__(self, game):
         self.game = game
 
-    def move(self):
+    def move(self, time_left=None, increment=0):
+        """time_left and increment are accepted for time-controlled matches, this engine always moves instantly"""
         board = self.game.board
         # find legal moves
         legal_moves = list(board.legal_moves)
@@ -1,81 +1,85 @@
 import random
-import chess
 
-# Pawn: chess.PAWN (1)
-# Knight: chess.KNIGHT (2)
-# Bishop: chess.BISHOP (3)
-# Rook: chess.ROOK (4)
-# Queen: chess.QUEEN (5)
-# King: chess.KING (6)
-piece_values = {1: 1, 2: 3, 3: 3, 4: 5, 5: 9, 6: 100}
+import numpy as np
+
+from engines.batch_eval import evaluate_children
 
 
 class v2_Eval:
-    def __init__(self, game):
+    def __init__(self, game, book=None):
         """
         Basic Evaluation, prioritizes checkmate, correctly values draws as 0
+        @param book: OpeningBook to play from before evaluating, book moves are counted in book_hits
         """
+        self.book = book
+        self.book_hits = 0
         self.game = game
-        self.position_counts = {}
+        self.best_eval = None  # score of the last move for the side that played it, None for book moves
 
-    def move(self):
+    def move(self, time_left=None, increment=0):
+        """time_left and increment are accepted for time-controlled matches, this engine only searches one ply"""
         board = self.game.board
         legal_moves = list(board.legal_moves)
         random.shuffle(legal_moves)
+        self.best_eval = None
         if len(legal_moves) == 0:
             return self.game.check_game_state()
 
-        is_white = board.turn
+        if self.book is not None:  # play from the book while it has moves
+            book_move = self.book.pick(board)
+            if book_move is not None:
+                self.book_hits += 1
+                board.push(book_move)
+                return self.game.check_game_state()
+
+        self.game.repetitions.sync(board)  # update to get move opponent played
+        board.push(self.pick_move(board, legal_moves))
+        return self.game.check_game_state()
+
+    def pick_move(self, board, legal_moves):
+        """
+        Scores all children at once with the batched evaluator, then only pushes the moves that need a board:
+        checks, which might be mate, and the best scored moves, which might stalemate or repeat
+        """
+        for move in legal_moves:  # checkmate beats everything, and only a checking move can mate
+            if board.gives_check(move):
+                board.push(move)
+                mate = board.is_checkmate()
+                board.pop()
+                if mate:
+                    self.best_eval = float('inf')
+                    return move
+
+        scores = evaluate_children(board, legal_moves)
         best_eval = float('-inf')
         best_move = legal_moves[0]
-        self.update_position_counts(board)  # update to get move opponent played
-
-        for move in legal_moves:
-            board.push(move)
-            self.update_position_counts(board)  # update to get move we're testing
-            eval = self.evaluate_board(board, is_white)
-            self.update_position_counts(board, decrement=True)  # remove tested move
+        for i in np.argsort(-scores, kind='stable'):  # keeps the shuffled order among equal scores
+            if scores[i] <= best_eval:  # a draw scored 0 can't beat the moves that are left
+                break
+            move = legal_moves[i]
+            eval = 0 if self.is_draw(board, move) else scores[i]
             if eval > best_eval:
                 best_move = move
                 best_eval = eval
-            board.pop()
-
-        board.push(best_move)
-        self.update_position_counts(board)  # update with move bot played
-        return self.game.check_game_state()
-
-    def evaluate_board(self, board, is_white):
-        score = 0
-        if board.is_checkmate():
-            return float('inf')
-        if board.is_stalemate() or self.is_potential_threefold_repetition(board):
-            return 0
-
-        for piece_type in chess.PIECE_TYPES:
-            for square in board.pieces(piece_type, chess.WHITE):
-                score += piece_values[piece_type]
-            for square in board.pieces(piece_type, chess.BLACK):
-                score -= piece_values[piece_type]
-        if not is_white:
-            score = -score
-        return score
+        self.best_eval = int(best_eval)
+        return best_move
 
-    def is_potential_threefold_repetition(self, board):
-        fen = board.fen()
-        return self.position_counts.get(fen, 0) >= 2
+    def is_draw(self, board, move):
+        """True if the move stalemates or repeats a position of the game"""
+        repetitions = self.game.repetitions
+        repetitions.push(board, move)
+        repeated = self.is_potential_threefold_repetition()
+        repetitions.pop()
+        if repeated:
+            return True
+        board.push(move)
+        stalemate = board.is_stalemate()
+        board.pop()
+        return stalemate
 
-    def update_position_counts(self, board, decrement=False):
-        fen = board.fen()
-        if decrement:
-            if fen in self.position_counts:
-                self.position_counts[fen] -= 1
-                if self.position_counts[fen] == 0:
-                    del self.position_counts[fen]
-        else:
-            if fen in self.position_counts:
-                self.position_counts[fen] += 1
-            else:
-                self.position_counts[fen] = 1
+    def is_potential_threefold_repetition(self):
+        """The position just pushed already occurred earlier in the game"""
+        return self.game.repetitions.is_repetition(2)
 
     def reset(self):
-        self.position_counts = {}
+        """Nothing to clear, the game resets its repetition tracker itself"""
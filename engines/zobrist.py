@@ -0,0 +1,106 @@
+import chess
+import chess.polyglot
+
+# Polyglot layout of the random array:
+#   0-767:   piece on square, 64 * (2 * (piece_type - 1) + color) + square
+#   768-771: castling rights (white kingside, white queenside, black kingside, black queenside)
+#   772-779: en passant file
+#   780:     white to move
+RANDOM_ARRAY = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+PIECE_KEYS = {color: {piece_type: [RANDOM_ARRAY[64 * (2 * (piece_type - 1) + color) + square]
+                                   for square in chess.SQUARES]
+                      for piece_type in chess.PIECE_TYPES}
+              for color in chess.COLORS}
+EP_KEYS = RANDOM_ARRAY[772:780]
+TURN_KEY = RANDOM_ARRAY[780]
+CASTLING_MASK = chess.BB_H1 | chess.BB_A1 | chess.BB_H8 | chess.BB_A8
+
+
+def _castling_key(rights):
+    key = 0
+    for i, square_mask in enumerate((chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8)):
+        if rights & square_mask:
+            key ^= RANDOM_ARRAY[768 + i]
+    return key
+
+
+# every combination of the four rook squares, keyed by the raw castling_rights bitmask
+CASTLING_KEYS = {}
+for _bits in range(16):
+    _rights = 0
+    for _i, _mask in enumerate((chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8)):
+        if _bits & (1 << _i):
+            _rights |= _mask
+    CASTLING_KEYS[_rights] = _castling_key(_rights)
+
+
+def hash_board(board):
+    """Full Zobrist hash, identical to chess.polyglot.zobrist_hash"""
+    return chess.polyglot.zobrist_hash(board)
+
+
+def ep_key(board, ep_square, turn):
+    """Key for an en passant square, only hashed when a pawn of the side to move could capture onto it"""
+    if ep_square is None:
+        return 0
+    pawns = board.pawns & board.occupied_co[turn]
+    capturers = chess.BB_PAWN_ATTACKS[not turn][ep_square]
+    if capturers & pawns:
+        return EP_KEYS[ep_square & 7]
+    return 0
+
+
+def update(board, key, move):
+    """
+    Incrementally computes the key of the position after a move
+    @param board: position before the move is pushed
+    @param key: Zobrist key of that position
+    @param move: move about to be pushed
+    @return: Zobrist key of the position after board.push(move)
+    """
+    turn = board.turn
+    from_square = move.from_square
+    to_square = move.to_square
+    piece_type = board.piece_type_at(from_square)
+    our_keys = PIECE_KEYS[turn]
+    their_keys = PIECE_KEYS[not turn]
+
+    key ^= TURN_KEY
+    key ^= ep_key(board, board.ep_square, turn)
+    rights = board.castling_rights & CASTLING_MASK
+    key ^= CASTLING_KEYS[rights]
+
+    # move the piece, promotions swap in the new piece type
+    key ^= our_keys[piece_type][from_square]
+    key ^= our_keys[move.promotion or piece_type][to_square]
+
+    captured = board.piece_type_at(to_square)
+    new_ep_square = None
+    if piece_type == chess.KING:
+        if board.is_castling(move):
+            # standard e1g1 style encoding, the king already moved above so only the rook is left
+            if to_square > from_square:  # kingside
+                rook_from, rook_to = from_square + 3, from_square + 1
+            else:
+                rook_from, rook_to = from_square - 4, from_square - 1
+            key ^= our_keys[chess.ROOK][rook_from] ^ our_keys[chess.ROOK][rook_to]
+        rights &= ~(chess.BB_RANK_1 if turn == chess.WHITE else chess.BB_RANK_8)
+    elif piece_type == chess.PAWN:
+        if board.is_en_passant(move):
+            captured_square = to_square - 8 if turn == chess.WHITE else to_square + 8
+            key ^= their_keys[chess.PAWN][captured_square]
+        elif abs(to_square - from_square) == 16:
+            new_ep_square = (from_square + to_square) // 2
+
+    if captured:
+        key ^= their_keys[captured][to_square]
+
+    rights &= ~chess.BB_SQUARES[from_square] & ~chess.BB_SQUARES[to_square]
+    key ^= CASTLING_KEYS[rights]
+
+    if new_ep_square is not None:
+        # the opponent's pawns adjacent to the destination can capture en passant
+        their_pawns = board.pawns & board.occupied_co[not turn]
+        if chess.BB_PAWN_ATTACKS[turn][new_ep_square] & their_pawns:
+            key ^= EP_KEYS[new_ep_square & 7]
+    return key
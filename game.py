@@ -1,9 +1,26 @@
 import chess
 
+from engines.repetition import RepetitionTracker
+
 
 class Game:
     def __init__(self):
+        self.material = None  # (pieces, pawns) the insufficient material check last ran for
+        self.insufficient_material = False
         self.board = chess.Board()  # python-chess chessboard
+        self.repetitions = RepetitionTracker(self.board)  # Zobrist keys of the game, shared with the engines
+        self.outcome = None  # chess.Outcome once the game has ended
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        """Replacing the board, for a start position or a UCI position, forgets what was cached about the old one"""
+        self._board = board
+        self.material = None
+        self.insufficient_material = False
 
     def get_piece(self, pos):
         return self.board.piece_at(pos)
@@ -16,12 +33,12 @@ class Game:
         try:
             if move in self.board.legal_moves:
                 self.board.push(move)
-                return self.check_game_state()
+                return 0 if self.check_game_state() is None else 1
             elif self.is_promotion(move):
                 # Convert the move to UCI, append 'q' for queen promotion, and convert back to a Move object
                 move = chess.Move.from_uci(move.uci() + 'q')
                 self.board.push(move)
-                return self.check_game_state()
+                return 0 if self.check_game_state() is None else 1
             else:
                 # print("Invalid move")
                 return -1
@@ -38,22 +55,46 @@ class Game:
         return False
 
     def check_game_state(self):
-        """Returns 1 if game is over, else 0"""
-        game_states = {
-            "is_checkmate": "Checkmate!",
-            "is_stalemate": "Stalemate",
-            "is_fivefold_repetition": "Five Fold Repetition",
-            "is_insufficient_material": "Insufficient Material",
-            "is_fifty_moves": "Fifty-Move Rule Draw",
-            "can_claim_threefold_repetition": "Threefold Repetition Draw"
-        }
-        # if self.board.is_game_over():
-        for state, message in game_states.items():
-            if getattr(self.board, f'{state}')():
-                print(message)
-                return 1
-        return 0
+        """
+        Termination check after every ply. Legal moves are generated at most once and only up to the first one,
+        repetitions come from the tracker and insufficient material is only looked at again after a capture
+        or promotion. Threefold repetition and the fifty-move rule end the game without being claimed.
+        @return: chess.Outcome with the result and reason if the game is over, else None
+        """
+        board = self.board
+        self.repetitions.sync(board)  # moves are pushed on the board directly
+        if not any(board.generate_legal_moves()):
+            if board.is_check():
+                self.outcome = chess.Outcome(chess.Termination.CHECKMATE, not board.turn)
+            else:
+                self.outcome = chess.Outcome(chess.Termination.STALEMATE, None)
+            return self.outcome
+        repetitions = self.repetitions.count()
+        if repetitions >= 5:
+            termination = chess.Termination.FIVEFOLD_REPETITION
+        elif self.is_insufficient_material():
+            termination = chess.Termination.INSUFFICIENT_MATERIAL
+        elif board.halfmove_clock >= 100:
+            termination = chess.Termination.FIFTY_MOVES
+        elif repetitions >= 3:
+            termination = chess.Termination.THREEFOLD_REPETITION
+        else:
+            return None
+        self.outcome = chess.Outcome(termination, None)
+        return self.outcome
+
+    def is_insufficient_material(self):
+        """Cached until the number of pieces or pawns changes, captures and promotions are all that matter"""
+        material = (bin(self.board.occupied).count('1'), bin(self.board.pawns).count('1'))
+        if material != self.material:
+            self.material = material
+            self.insufficient_material = self.board.is_insufficient_material()
+        return self.insufficient_material
 
     def restart(self):
         """Logs the winner and resets the board for a new game."""
         self.board.reset()
+        self.repetitions.reset(self.board)
+        self.outcome = None
+        self.material = None
+        self.insufficient_material = False
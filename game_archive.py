@@ -0,0 +1,213 @@
+import argparse
+import ast
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+import chess
+
+from match_log import MatchLog
+
+ARCHIVE_MAGIC = b"CGA2"  # CGA2 added the start position
+INDEX_MAGIC = b"CGI1"
+# seed (-1 when unknown), number of moves, result, length of the white and black engine names and of the start FEN
+# (0 for the standard start position)
+GAME_HEADER = struct.Struct('<qHBBBB')
+OFFSET = struct.Struct('<Q')
+RESULTS = ["*", "1-0", "0-1", "1/2-1/2"]  # stored as the index into this list
+
+ArchivedGame = namedtuple('ArchivedGame', ['white', 'black', 'result', 'seed', 'moves', 'start_fen'])
+
+
+def encode_move(move):
+    """16 bits: from square, to square << 6, promotion piece type - 1 << 12 (0 for none)"""
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.from_square | move.to_square << 6 | promotion << 12
+
+
+def decode_move(code):
+    promotion = code >> 12
+    return chess.Move(code & 63, code >> 6 & 63, promotion + 1 if promotion else None)
+
+
+class ArchiveWriter:
+    def __init__(self, path):
+        """
+        Appends games to an archive, creating it if needed.
+        Games are stored back to back in path, the byte offset of every game goes in path + '.idx'.
+        """
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        new = not os.path.exists(path)
+        if not new:
+            with open(path, "rb") as existing:
+                if existing.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                    raise ValueError(f"{path} is not a game archive of this version, can't add to it")
+        self.archive_file = open(path, "ab")
+        self.index_file = open(path + ".idx", "ab")
+        if new:
+            self.archive_file.write(ARCHIVE_MAGIC)
+            self.index_file.write(INDEX_MAGIC)
+
+    def add_game(self, white, black, result, moves, seed=None, start_fen=None):
+        """
+        @param result: '1-0', '0-1', '1/2-1/2' or '*'
+        @param moves: chess.Move objects or uci strings
+        @param start_fen: position the game started from, None for the standard one
+        """
+        white, black = white.encode(), black.encode()
+        start_fen = start_fen.encode() if start_fen and start_fen != chess.STARTING_FEN else b""
+        moves = [chess.Move.from_uci(move) if isinstance(move, str) else move for move in moves]
+        offset = self.archive_file.tell()
+        self.archive_file.write(GAME_HEADER.pack(-1 if seed is None else seed, len(moves), RESULTS.index(result),
+                                                 len(white), len(black), len(start_fen)))
+        self.archive_file.write(white + black + start_fen)
+        self.archive_file.write(struct.pack(f'<{len(moves)}H', *map(encode_move, moves)))
+        self.archive_file.flush()  # the game is on disk before its offset, an offset never points past the end
+        self.index_file.write(OFFSET.pack(offset))
+        self.index_file.flush()
+
+    def close(self):
+        self.archive_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameArchive:
+    def __init__(self, path):
+        """
+        Read side of an archive, both files are memory mapped so loading game N only touches its own bytes
+        """
+        self.path = path
+        self.archive_file = open(path, "rb")
+        self.index_file = open(path + ".idx", "rb")
+        self.archive = mmap.mmap(self.archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.archive[:4] != ARCHIVE_MAGIC or self.index[:4] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a game archive")
+
+    def __len__(self):
+        return (len(self.index) - len(INDEX_MAGIC)) // OFFSET.size
+
+    def offset(self, n):
+        if not 0 <= n < len(self):
+            raise IndexError(f"game {n} is not in {self.path}, it has {len(self)}")
+        return OFFSET.unpack_from(self.index, len(INDEX_MAGIC) + n * OFFSET.size)[0]
+
+    def header(self, n):
+        """Game n without decoding its moves, moves holds their number, for tools that only need results"""
+        offset = self.offset(n)
+        seed, num_moves, result, white_length, black_length, fen_length = GAME_HEADER.unpack_from(self.archive,
+                                                                                                   offset)
+        names = offset + GAME_HEADER.size
+        fen_at = names + white_length + black_length
+        white = self.archive[names:names + white_length].decode()
+        black = self.archive[names + white_length:fen_at].decode()
+        start_fen = self.archive[fen_at:fen_at + fen_length].decode() or None
+        return ArchivedGame(white, black, RESULTS[result], None if seed < 0 else seed, num_moves, start_fen)
+
+    def __getitem__(self, n):
+        game = self.header(n)
+        moves_at = self.offset(n) + GAME_HEADER.size + len(game.white.encode()) + len(game.black.encode()) + \
+            len((game.start_fen or "").encode())
+        codes = struct.unpack_from(f'<{game.moves}H', self.archive, moves_at)
+        return game._replace(moves=[decode_move(code) for code in codes])
+
+    def __iter__(self):
+        return (self[n] for n in range(len(self)))
+
+    def close(self):
+        self.archive.close()
+        self.index.close()
+        self.archive_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_text_log(path):
+    """
+    Games of a simulation_results text log, as (white, black, result, uci moves).
+    Decisive games have the winner's color written next to it. Colors aren't written for draws, those fall back
+    to run_simulations giving bot1 white in every even game of a run.
+    """
+    with open(path) as log_file:
+        bot1 = bot2 = None
+        game = 0
+        for line in log_file:
+            if " vs. " in line and not line.startswith(" "):
+                bot1, bot2 = line.strip().split(" vs. ")
+                game = 0
+            elif line.startswith(" ") and "|" in line and "[" in line:
+                winner, color, moves = line.split("|", 2)
+                winner, color = winner.strip(), color.strip()
+                if winner == "Draw":
+                    white, black = (bot1, bot2) if game % 2 == 0 else (bot2, bot1)
+                    result = "1/2-1/2"
+                else:
+                    loser = bot2 if winner == bot1 else bot1
+                    white, black = (winner, loser) if color == "White" else (loser, winner)
+                    result = "1-0" if color == "White" else "0-1"
+                yield white, black, result, ast.literal_eval(moves.strip())
+                game += 1
+
+
+def convert(paths, output):
+    """
+    Adds the games of text logs (.txt) and match logs (.jsonl) to an archive
+    @return: number of games added
+    """
+    added = 0
+    with ArchiveWriter(output) as writer:
+        for path in paths:
+            if path.endswith(".jsonl"):
+                for record in MatchLog(path).records():
+                    writer.add_game(record['white'], record['black'], record['result'], record['moves'],
+                                    record['seed'], record.get('start_fen'))
+                    added += 1
+            else:
+                for white, black, result, moves in read_text_log(path):
+                    writer.add_game(white, black, result, moves)
+                    added += 1
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Binary game archive, 16 bit moves and a random access index")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help="add text or match logs to an archive")
+    convert_parser.add_argument('logs', nargs='+')
+    convert_parser.add_argument('-o', '--output', required=True)
+    show_parser = commands.add_parser('show', help="print game N")
+    show_parser.add_argument('archive')
+    show_parser.add_argument('game', type=int)
+    replay_parser = commands.add_parser('replay', help="replay game N on the board")
+    replay_parser.add_argument('archive')
+    replay_parser.add_argument('game', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        print(f"added {convert(args.logs, args.output)} games to {args.output}")
+    else:
+        with GameArchive(args.archive) as archive:
+            game = archive[args.game]
+        if args.command == 'show':
+            print(f"{game.white} vs. {game.black}, {game.result}, seed {game.seed}, {len(game.moves)} moves")
+            if game.start_fen:
+                print(f"from {game.start_fen}")
+            print(" ".join(move.uci() for move in game.moves))
+        else:
+            from simulation_renderer import replay_game  # pygame only when there's something to show
+            replay_game([move.uci() for move in game.moves], game.start_fen)
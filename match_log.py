@@ -0,0 +1,110 @@
+import json
+import os
+
+
+class MatchLog:
+    def __init__(self, path):
+        """
+        Append-only JSON lines log of a match, one record per finished game, flushed to disk as soon as the game
+        ends so a crash loses at most the games that were still being played.
+        Next to it a manifest keeps the settings of the run, which is all --resume needs to carry on.
+        @param path: the log file, the manifest is path + '.manifest.json'
+        """
+        self.path = path
+        self.manifest_path = path + ".manifest.json"
+
+    def start(self, manifest):
+        """Begins a new run, refuses to overwrite the log of an earlier one"""
+        if os.path.exists(self.path):
+            raise FileExistsError(f"{self.path} already exists, resume it or log to another file")
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"  # replaced in one step, never half written
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temp_path, self.manifest_path)
+        open(self.path, "w").close()
+
+    def load_manifest(self):
+        with open(self.manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def repair(self):
+        """Cuts off a last record that a crash left half written, so new records start on a line of their own"""
+        if not os.path.exists(self.path):
+            open(self.path, "w").close()
+            return
+        with open(self.path, "rb+") as log_file:
+            log_file.seek(0, os.SEEK_END)
+            size = log_file.tell()
+            end = size
+            while end > 0:
+                log_file.seek(end - 1)
+                if log_file.read(1) == b"\n":
+                    break
+                end -= 1
+            if end < size:
+                log_file.truncate(end)
+
+    def append(self, record):
+        with open(self.path, "a") as log_file:
+            log_file.write(json.dumps(record) + "\n")
+            log_file.flush()
+            os.fsync(log_file.fileno())
+
+    def records(self):
+        """Streams the finished games, one record at a time"""
+        with open(self.path) as log_file:
+            for line in log_file:
+                if line.endswith("\n"):  # anything else is a record that was being written during a crash
+                    yield json.loads(line)
+
+    def completed(self):
+        """Indices of the games that are already in the log"""
+        return {record['game'] for record in self.records()}
+
+    def win_count(self, bot1_name, bot2_name):
+        win_count = {bot1_name: 0, bot2_name: 0, "Draw": 0}
+        for record in self.records():
+            win_count[record['winner']] += 1
+        return win_count
+
+
+def resume_settings(path):
+    """
+    Settings of the run in an earlier match log, everything --resume needs to carry it on
+    @return: bot1, bot2 as (name, kwargs), games, seed, start fens, clock, SPRT settings and adjudication settings
+    @raise ValueError: the run was started with engines built in code, their kwargs weren't recorded
+    """
+    manifest = MatchLog(path).load_manifest()
+    bot1, bot2 = tuple(manifest['bot1']), tuple(manifest['bot2'])
+    if bot1[1] is None or bot2[1] is None:
+        raise ValueError(f"{path} was started with engines built in code, their settings aren't known")
+    clock = tuple(manifest['clock']) if manifest['clock'] else None
+    return (bot1, bot2, manifest['games'], manifest['seed'], manifest['start_fens'], clock, manifest.get('sprt'),
+            manifest.get('adjudication'))
+
+
+def game_record(index, seed, white, black, winner, board, termination, time_used, start_fen=None):
+    """
+    One finished game as it is written to the log
+    @param board: final board, its move stack is the game
+    @param time_used: {bot name: seconds spent on its moves}
+    """
+    if winner == "Draw":
+        result = "1/2-1/2"
+    else:
+        result = "1-0" if winner == white else "0-1"
+    return {
+        'game': index,
+        'seed': seed,
+        'white': white,
+        'black': black,
+        'start_fen': start_fen,
+        'result': result,
+        'winner': winner,
+        'termination': termination,
+        'moves': [move.uci() for move in board.move_stack],
+        'time': time_used,
+    }
@@ -0,0 +1,183 @@
+import argparse
+import sys
+import time
+
+import chess
+
+from engines.bitboard import Position, move_uci
+
+# (name, fen, {depth: leaf nodes}), counts are the published values for these positions
+PERFT_POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    # en passant that would expose the king, discovered checks through the captured pawn
+    ("illegal-ep-1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {1: 18, 2: 92, 3: 1670, 6: 1134888}),
+    ("illegal-ep-2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {1: 13, 2: 102, 3: 1266, 6: 1015133}),
+    ("ep-capture-checker", "8/8/1k6/2b5/2pP4/8/5K2/8 b - - 0 1", {1: 14, 2: 121, 3: 1843, 6: 1440467}),
+    # castling
+    ("short-castle-check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", {1: 15, 2: 66, 3: 1198, 6: 661072}),
+    ("long-castle-check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {1: 16, 2: 71, 3: 1286, 6: 803711}),
+    ("castle-rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {1: 26, 2: 1141, 3: 27826, 4: 1274206}),
+    ("castling-prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {1: 44, 2: 1494, 3: 50509, 4: 1720476}),
+    # promotions
+    ("promote-out-of-check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {1: 11, 2: 133, 3: 1442, 6: 3821001}),
+    ("discovered-check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {1: 29, 2: 165, 3: 5160, 5: 1004658}),
+    ("promote-give-check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {1: 9, 2: 40, 3: 472, 6: 217342}),
+    ("under-promote", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", {1: 6, 2: 27, 3: 273, 6: 92683}),
+    ("self-stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {1: 2, 2: 6, 3: 13, 6: 2217}),
+    ("stalemate-checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {1: 10, 2: 25, 3: 268, 7: 567584}),
+    ("double-check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {1: 37, 2: 183, 3: 6559, 4: 23527}),
+]
+QUICK_NODES = 100000  # without --depth every position runs at its deepest known depth up to this many nodes
+
+
+class PythonChessBackend:
+    """Reference move generator, chess.Board.legal_moves"""
+    name = 'python-chess'
+
+    @staticmethod
+    def load(fen):
+        return chess.Board(fen)
+
+    def perft(self, board, depth, bulk=True):
+        if depth == 0:
+            return 1
+        if bulk and depth == 1:
+            return board.legal_moves.count()
+        nodes = 0
+        for move in board.legal_moves:
+            board.push(move)
+            nodes += self.perft(board, depth - 1, bulk)
+            board.pop()
+        return nodes
+
+    def divide(self, board, depth, bulk=True):
+        counts = {}
+        for move in board.legal_moves:
+            board.push(move)
+            counts[move.uci()] = self.perft(board, depth - 1, bulk)
+            board.pop()
+        return counts
+
+
+class BitboardBackend:
+    """The search's own Position, pseudo-legal generation with make() rejecting illegal moves"""
+    name = 'bitboard'
+
+    @staticmethod
+    def load(fen):
+        return Position.from_fen(fen)
+
+    def perft(self, pos, depth, bulk=True):
+        if depth == 0:
+            return 1
+        nodes = 0
+        if bulk and depth == 1:
+            for move in pos.generate_moves():
+                if pos.make(move):
+                    pos.unmake()
+                    nodes += 1
+            return nodes
+        for move in pos.generate_moves():
+            if pos.make(move):
+                nodes += self.perft(pos, depth - 1, bulk)
+                pos.unmake()
+        return nodes
+
+    def divide(self, pos, depth, bulk=True):
+        counts = {}
+        for move in pos.generate_moves():
+            if pos.make(move):
+                counts[move_uci(move)] = self.perft(pos, depth - 1, bulk)
+                pos.unmake()
+        return counts
+
+
+# any object with name, load(fen), perft(state, depth, bulk) and divide(state, depth, bulk) can be added
+BACKENDS = {backend.name: backend for backend in (PythonChessBackend(), BitboardBackend())}
+
+
+def quick_depth(expected):
+    return max((depth for depth, nodes in expected.items() if nodes <= QUICK_NODES), default=1)
+
+
+def run_suite(backends, depth=None, bulk=True, names=None):
+    """
+    Runs perft on the test positions with every backend, checking against the known counts
+    @return: {backend name: (total nodes, total seconds)}, and the list of mismatches
+    """
+    totals = {backend.name: [0, 0.0] for backend in backends}
+    failures = []
+    print(f"{'Position':>20} | {'Depth':>5} | {'Backend':>12} | {'Nodes':>10} | {'Nodes/sec':>10} | Result")
+    for name, fen, expected in PERFT_POSITIONS:
+        if names and name not in names:
+            continue
+        position_depth = depth or quick_depth(expected)
+        for backend in backends:
+            state = backend.load(fen)
+            start = time.perf_counter()
+            nodes = backend.perft(state, position_depth, bulk)
+            elapsed = time.perf_counter() - start
+            totals[backend.name][0] += nodes
+            totals[backend.name][1] += elapsed
+            if position_depth not in expected:
+                result = "?"
+            elif nodes == expected[position_depth]:
+                result = "ok"
+            else:
+                result = f"FAIL, expected {expected[position_depth]}"
+                failures.append((name, backend.name, position_depth, nodes, expected[position_depth]))
+            nps = nodes / elapsed if elapsed > 0 else 0
+            print(f"{name:>20} | {position_depth:>5} | {backend.name:>12} | {nodes:>10} | {nps:>10.0f} | {result}")
+    return {name: tuple(total) for name, total in totals.items()}, failures
+
+
+def print_divide(backends, fen, depth, bulk=True):
+    """Node count under every root move, side by side per backend, differing moves are marked"""
+    results = [backend.divide(backend.load(fen), depth, bulk) for backend in backends]
+    moves = sorted(set().union(*results))
+    print(f"{'Move':>6} | " + " | ".join(f"{backend.name:>12}" for backend in backends))
+    for move in moves:
+        counts = [result.get(move) for result in results]
+        marker = "" if len(set(counts)) == 1 else "  <-- differs"
+        print(f"{move:>6} | " + " | ".join(f"{'-' if c is None else c:>12}" for c in counts) + marker)
+    print(f"{'total':>6} | " + " | ".join(f"{sum(result.values()):>12}" for result in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft move generation check and throughput")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--depth', type=int, help="depth for every position, default is a quick depth per position")
+    parser.add_argument('--positions', nargs='+', choices=[name for name, _, _ in PERFT_POSITIONS])
+    parser.add_argument('--fen', help="divide a custom position instead of running the suite")
+    parser.add_argument('--divide', action='store_true', help="per root move counts, for --fen or --positions")
+    parser.add_argument('--no-bulk', action='store_true', help="count leaves one by one instead of at the last ply")
+    args = parser.parse_args()
+    backends = [BACKENDS[name] for name in args.backends]
+    bulk = not args.no_bulk
+
+    if args.divide or args.fen:
+        fens = [args.fen] if args.fen else [fen for name, fen, _ in PERFT_POSITIONS if name in (args.positions or [])]
+        if not fens:
+            parser.error("--divide needs --fen or --positions")
+        for fen in fens:
+            print(fen)
+            print_divide(backends, fen, args.depth or 3, bulk)
+        sys.exit(0)
+
+    totals, failures = run_suite(backends, args.depth, bulk, args.positions)
+    print()
+    for name, (nodes, elapsed) in totals.items():
+        print(f"{name:>12}: {nodes} nodes in {elapsed:.2f}s, {nodes / elapsed if elapsed else 0:.0f} nodes/sec")
+    if failures:
+        sys.exit(1)
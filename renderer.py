@@ -3,20 +3,13 @@ import chess
 import keyboard
 import time
 
+from board_view import BoardView, SCREEN_WIDTH, SQUARE_SIZE, centered, popup_surface
 from game import Game
 from engines.v2_eval import v2_Eval
 from v3_minimax import v3_Minimax
 
-SCREEN_WIDTH = 640
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
-LIGHT_BROWN = (237, 214, 176, 255)
-DARK_BROWN = (184, 135, 98, 255)
-DARK_HIGHLIGHT_COLOR = (224, 196, 76)
-LIGHT_HIGHLIGHT_COLOR = (248, 236, 116)
-SQUARE_SIZE = 80
-restart_button_rect = None
-quit_button_rect = None
 
 
 def load_pieces():
@@ -61,6 +54,9 @@ class Renderer:
         self.selected_piece = None
         self.grabbed_piece = None
         self.piece_images = load_pieces()
+        self.view = BoardView(self.screen, self.piece_images)
+        self.font = pygame.font.Font(None, 50)
+        self.game_end_popup = popup_surface(self.font, "Game Over")
 
     def get_square_from_pos(self, pos):
         """Convert pixel position to chessboard square."""
@@ -71,52 +67,20 @@ class Renderer:
             row = 7 - row
         return chess.square(col, row)
 
-    def draw_highlight(self, screen, square, highlight, col, row):
-        """Helper function to draw highlights on the board."""
-        pygame.draw.rect(screen, highlight, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
     def draw_board(self, screen):
-        """Draw the chessboard and pieces."""
-        for row in range(8):
-            for col in range(8):
-                if self.piece_color == chess.WHITE:
-                    square = chess.square(col, 7 - row)
-                else:
-                    square = chess.square(col, row)
-                if (row + col) % 2 == 0:  # light square
-                    color = LIGHT_BROWN
-                    highlight = LIGHT_HIGHLIGHT_COLOR
-                else:
-                    color = DARK_BROWN
-                    highlight = DARK_HIGHLIGHT_COLOR
-
-                # draws board
-                pygame.draw.rect(screen, color, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE,
-                                                            SQUARE_SIZE))
-
-                # draws highlighted squares
-                highlights = [
-                    (self.selected_piece and self.selected_piece[1] == square, highlight),
-                    (self.move_to and self.move_to == square, highlight),
-                    (self.move_from and self.move_from == square, highlight)]
-                for condition, highlight_color in highlights:
-                    if condition:
-                        self.draw_highlight(screen, square, highlight_color, col, row)
-
-                # Draw pieces, doesn't draw dragged piece
-                piece = self.game.get_piece(square)
-                if piece and not (self.grabbed_piece and self.grabbed_piece[1] == square):
-                    piece_image = self.piece_images[piece.symbol()]
-                    screen.blit(piece_image, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-
-        # Draw the piece being dragged at the mouse position
-        if self.grabbed_piece:
+        """Draw the squares that changed since the last frame, the dragged piece and the game over popup."""
+        highlighted = {square for square in (self.move_from, self.move_to) if square is not None}
+        if self.selected_piece:
+            highlighted.add(self.selected_piece[1])
+        overlays = []
+        if self.grabbed_piece:  # the piece being dragged follows the mouse
             mouse_x, mouse_y = pygame.mouse.get_pos()
-            screen.blit(self.piece_images[self.grabbed_piece[0].symbol()],
-                        (mouse_x - SQUARE_SIZE // 2, mouse_y - SQUARE_SIZE // 2))
-
+            overlays.append((self.piece_images[self.grabbed_piece[0].symbol()],
+                             (mouse_x - SQUARE_SIZE // 2, mouse_y - SQUARE_SIZE // 2)))
         if self.game_ended:
-            self.draw_game_end_popup()
+            overlays.append((self.game_end_popup, centered(self.game_end_popup)))
+        self.view.render(self.game.board, self.piece_color == chess.BLACK, highlighted,
+                         self.grabbed_piece[1] if self.grabbed_piece else None, overlays)
 
     def run(self):
         while True:
@@ -131,10 +95,8 @@ class Renderer:
             self.clock.tick(60)
 
     def update_screen(self):
-        self.screen.fill(BLACK)
         self.update_last_move()
-        self.draw_board(self.screen)
-        pygame.display.flip()
+        self.draw_board(self.screen)  # updates only the dirty parts of the window
 
     def update_last_move(self):
         last_move = self.game.board.move_stack[-1] if self.game.board.move_stack else None
@@ -147,6 +109,8 @@ class Renderer:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
+            if event.type == pygame.WINDOWEXPOSED:  # window contents were lost, redraw all of it
+                self.view.invalidate()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 move_status = -1
@@ -196,6 +160,7 @@ class Renderer:
             move_status = self.white_engine.move() # white moves if its whites turn
         else:
             move_status = self.black_engine.move()  # black moves if its blacks turn
+        move_status = 0 if move_status is None else 1  # engines return the game's outcome
 
         # Get the start and end squares of the last move
         last_move = self.game.board.move_stack[-1] if self.game.board.move_stack else None
@@ -232,35 +197,13 @@ class Renderer:
             self.game_ended = False
             time.sleep(0.1)  # one move at a time
 
-    @staticmethod
-    def handle_game_end_events():
+    def handle_game_end_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
-
-    def draw_game_end_popup(self):
-        # Define popup dimensions and colors
-        global restart_button_rect, quit_button_rect
-        rect_width = 300
-        rect_height = 125
-        rect_x = SCREEN_WIDTH / 2 - rect_width / 2
-        rect_y = SCREEN_WIDTH / 2 - rect_height / 2
-        popup_color = (0, 0, 0, 128)  # (R, G, B, A) with A = 128 for 50% transparency
-        border_color = (255, 255, 255)
-        text_color = (255, 255, 255)
-
-        # Create a surface for the popup with an alpha channel (RGBA)
-        popup_surface = pygame.Surface((rect_width, rect_height), pygame.SRCALPHA)
-        popup_surface.fill(popup_color)
-        self.screen.blit(popup_surface, (rect_x, rect_y))
-        pygame.draw.rect(self.screen, border_color, (rect_x, rect_y, rect_width, rect_height), 5)
-
-        # Draw "Renderer Over" text
-        font = pygame.font.Font(None, 50)
-        game_over_text = font.render("Game Over", True, text_color)
-        self.screen.blit(game_over_text, (rect_x + rect_width / 2 - game_over_text.get_width() / 2,
-                                          rect_y + rect_height / 2 - game_over_text.get_height() / 2))
+            if event.type == pygame.WINDOWEXPOSED:
+                self.view.invalidate()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+import argparse
+import json
+import math
+import sqlite3
+import time
+
+from match_log import MatchLog
+from sprt import score_to_elo
+
+BATCH_SIZE = 50  # games buffered before they're written in one transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT,
+    bot1 TEXT,
+    bot2 TEXT,
+    log_path TEXT UNIQUE,
+    settings TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    run_id INTEGER REFERENCES runs(id),
+    game INTEGER,
+    white TEXT,
+    black TEXT,
+    result TEXT,
+    winner TEXT,
+    winner_color TEXT,
+    termination TEXT,
+    plies INTEGER,
+    seed INTEGER,
+    start_fen TEXT,
+    moves TEXT,
+    white_time REAL,
+    black_time REAL,
+    PRIMARY KEY (run_id, game)
+);
+CREATE TABLE IF NOT EXISTS moves (
+    run_id INTEGER,
+    game INTEGER,
+    ply INTEGER,
+    engine TEXT,
+    move TEXT,
+    eval REAL,
+    depth INTEGER,
+    seldepth INTEGER,
+    nodes INTEGER,
+    qnodes INTEGER,
+    nps REAL,
+    time REAL,
+    book INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_pair ON games (white, black);
+CREATE INDEX IF NOT EXISTS games_result ON games (result);
+CREATE INDEX IF NOT EXISTS games_winner_color ON games (winner_color);
+CREATE INDEX IF NOT EXISTS moves_game ON moves (run_id, game);
+CREATE INDEX IF NOT EXISTS moves_engine ON moves (engine);
+"""
+
+
+class ResultsStore:
+    def __init__(self, path):
+        """
+        SQLite database of runs, their games and the per-move search stats of engines that keep telemetry.
+        Runs in WAL mode so queries can read while a match writes, games go in batches of BATCH_SIZE.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # the match log is the crash-safe copy
+        self.connection.executescript(SCHEMA)
+        self.run_id = None
+        self.games = []
+        self.moves = []
+
+    def start_run(self, bot1_name, bot2_name, manifest, log_path):
+        """
+        Registers a run, or picks the existing one up again when its match log is resumed.
+        Games the log has but the database doesn't, still buffered when the run stopped, are added from the log
+        """
+        row = self.connection.execute("SELECT id FROM runs WHERE log_path = ?", (log_path,)).fetchone()
+        if row is not None:
+            self.run_id = row[0]
+            stored = {game for game, in self.connection.execute("SELECT game FROM games WHERE run_id = ?",
+                                                                 (self.run_id,))}
+            for record in MatchLog(log_path).records():
+                if record['game'] not in stored:  # their search stats were only in memory
+                    self.add_game(record)
+            self.flush()
+            return self.run_id
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started, bot1, bot2, log_path, settings) VALUES (?, ?, ?, ?, ?)",
+                (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()), bot1_name, bot2_name, log_path,
+                 json.dumps(manifest)))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def add_game(self, record, stats=()):
+        """
+        @param record: match log record of the game
+        @param stats: SearchStats of the game's moves as dicts
+        """
+        winner = record['winner']
+        winner_color = None if winner == "Draw" else ("white" if winner == record['white'] else "black")
+        self.games.append((self.run_id, record['game'], record['white'], record['black'], record['result'], winner,
+                           winner_color, record['termination'], len(record['moves']), record['seed'],
+                           record['start_fen'], " ".join(record['moves']), record['time'].get(record['white']),
+                           record['time'].get(record['black'])))
+        self.moves.extend((self.run_id, record['game'], s['ply'], s['engine'], s['move'], s['eval'], s['depth'],
+                           s['seldepth'], s['nodes'], s['qnodes'], s['nps'], s['time'], s['book']) for s in stats)
+        if len(self.games) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        with self.connection:  # one transaction for the batch
+            self.connection.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        self.games)
+            self.connection.executemany("INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.moves)
+        self.games = []
+        self.moves = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def runs_filter(runs):
+    if not runs:
+        return "", ()
+    return f" WHERE run_id IN ({', '.join('?' * len(runs))})", tuple(runs)
+
+
+def list_runs(connection):
+    """@return: rows of (id, started, bot1, bot2, games)"""
+    return connection.execute(
+        "SELECT runs.id, started, bot1, bot2, COUNT(games.game) FROM runs LEFT JOIN games ON games.run_id = runs.id "
+        "GROUP BY runs.id ORDER BY runs.id").fetchall()
+
+
+def pair_results(connection, runs=None):
+    """
+    Wins, draws and losses of every engine pair over both colors, with the Elo of the first engine over the second
+    @return: rows of (engine, opponent, games, wins, draws, losses, elo, elo low, elo high), 95% error bars
+    """
+    where, args = runs_filter(runs)
+    rows = connection.execute(
+        "SELECT white, black, winner_color, COUNT(*) FROM games" + where + " GROUP BY white, black, winner_color",
+        args).fetchall()
+    pairs = {}
+    for white, black, winner_color, count in rows:
+        engine, opponent = sorted((white, black))
+        counts = pairs.setdefault((engine, opponent), [0, 0, 0])  # wins, draws, losses of engine
+        if winner_color is None:
+            counts[1] += count
+        elif (winner_color == "white") == (white == engine):
+            counts[0] += count
+        else:
+            counts[2] += count
+    results = []
+    for (engine, opponent), (wins, draws, losses) in sorted(pairs.items()):
+        games = wins + draws + losses
+        score = (wins + draws / 2) / games
+        variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+        error = 1.96 * math.sqrt(variance / games)
+        results.append((engine, opponent, games, wins, draws, losses, score_to_elo(score),
+                        score_to_elo(score - error), score_to_elo(score + error)))
+    return results
+
+
+def engine_stats(connection, runs=None):
+    """
+    Average game length and time per move of every engine, and the search stats of those that keep telemetry
+    @return: rows of (engine, games, average plies, seconds per move, nodes/sec, average depth)
+    """
+    where, args = runs_filter(runs)
+    games = connection.execute(
+        "SELECT engine, COUNT(*), AVG(plies), SUM(engine_time) / SUM(plies / 2.0) FROM ("
+        "SELECT white AS engine, plies, white_time AS engine_time FROM games" + where +
+        " UNION ALL SELECT black, plies, black_time FROM games" + where + ") GROUP BY engine",
+        args + args).fetchall()
+    search = {engine: (nps, depth) for engine, nps, depth in connection.execute(
+        "SELECT engine, AVG(nps), AVG(depth) FROM moves" + (where + " AND" if where else " WHERE") +
+        " book = 0 GROUP BY engine", args)}
+    rows = []
+    for engine, count, plies, move_time in games:
+        nps, depth = search.get(engine.split("(")[0], (None, None))  # same engine playing itself is name(1)
+        rows.append((engine, count, plies, move_time, nps, depth))
+    return rows
+
+
+def import_logs(store, paths):
+    """Adds the games of existing match logs, each as its own run"""
+    for path in paths:
+        match_log = MatchLog(path)
+        manifest = match_log.load_manifest()
+        bot1_name, bot2_name = manifest['bot1'][0], manifest['bot2'][0]
+        if bot1_name == bot2_name:
+            bot2_name += "(1)"
+        store.start_run(bot1_name, bot2_name, manifest, path)
+        for record in match_log.records():
+            store.add_game(record)
+        store.flush()
+
+
+def print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print(" | ".join(f"{str(value):>{width}}" for value, width in zip(row, widths)))
+
+
+def rounded(value, digits=1):
+    return "-" if value is None else round(value, digits)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the match results database")
+    parser.add_argument('db')
+    parser.add_argument('--run', type=int, action='append', dest='runs', help="only this run id, can be repeated")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs', help="list the runs")
+    commands.add_parser('pairs', help="win rates and Elo of every engine pair")
+    commands.add_parser('engines', help="game length, time per move, nodes/sec and depth per engine")
+    import_parser = commands.add_parser('import', help="add match logs to the database")
+    import_parser.add_argument('logs', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        results = ResultsStore(args.db)
+        import_logs(results, args.logs)
+        results.close()
+    else:
+        connection = sqlite3.connect(args.db)
+        if args.command == 'runs':
+            print_table(("Run", "Started", "Bot 1", "Bot 2", "Games"), list_runs(connection))
+        elif args.command == 'pairs':
+            print_table(("Engine", "Opponent", "Games", "W", "D", "L", "Elo", "Low", "High"),
+                        [row[:6] + tuple(rounded(value) for value in row[6:])
+                         for row in pair_results(connection, args.runs)])
+        else:
+            print_table(("Engine", "Games", "Plies", "Sec/move", "Nodes/sec", "Depth"),
+                        [(engine, games, rounded(plies), rounded(move_time, 4), rounded(nps, 0), rounded(depth, 2))
+                         for engine, games, plies, move_time, nps, depth in engine_stats(connection, args.runs)])
@@ -1,25 +1,68 @@
-import cProfile
+import argparse
 import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
 
 import chess
-import chess.pgn
 from game import Game
 import time
 
 from engines.v1_random import v1_Random
 from engines.v2_eval import v2_Eval
+from adjudication import Adjudicator, add_adjudication_arguments, adjudication_settings
+from match_log import MatchLog, game_record, resume_settings
+from results_db import ResultsStore
+from sprt import SPRT
 from simulation_renderer import SimulationRenderer
 from v3_minimax import v3_Minimax
 
+# engines a worker process can build by name
+ENGINES = {'v1_Random': v1_Random, 'v2_Eval': v2_Eval, 'v3_Minimax': v3_Minimax}
+
 
 class Simulate:
 
     def __init__(self):
         self.game = Game()
         self.renderer = None
+        self.time_used = {}  # seconds each bot spent on its moves in the last game
+        self.termination = None  # why the last game ended
+
+    @staticmethod
+    def open_log(bot1_name, bot2_name, log_path, resume, manifest):
+        """
+        Match log of a run, a new one unless resuming
+        @param log_path: None names it after the bots and the start time
+        """
+        if log_path is None:
+            log_path = os.path.join('simulation_results',
+                                    f"{bot1_name}_vs_{bot2_name}_{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        match_log = MatchLog(log_path)
+        if resume:
+            match_log.repair()
+        else:
+            match_log.start(manifest)
+        return match_log
+
+    @staticmethod
+    def game_stats(bots):
+        """SearchStats of the current game's moves, as dicts, from the bots that keep telemetry"""
+        return [asdict(stats) for bot in bots if hasattr(bot, 'telemetry')
+                for stats in bot.telemetry.records]
 
     @staticmethod
-    def log_results(bot1_name, bot2_name, data, win_count, uci_moves_list):
+    def add_to_sprt(sprt, record, bot1_name):
+        """Counts a finished game in the SPRT, if there is one, @return: True once the test is decided"""
+        if sprt is None:
+            return False
+        score = 0.5 if record['winner'] == "Draw" else float(record['winner'] == bot1_name)
+        sprt.add_game(record['game'], score)
+        return sprt.status() is not None
+
+    @staticmethod
+    def log_results(bot1_name, bot2_name, match_log):
+        """Writes the summary of a run, streamed from its match log"""
         col_width = max(len(bot1_name), len(bot2_name)) + 2
         header = f"{' Result':<{col_width}}| {'Winning Color':<{col_width}}\n"
         current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
@@ -31,83 +74,288 @@ class Simulate:
             log_file.write(f"Simulation started at: {current_time}\n")
             log_file.write(f"{bot1_name} vs. {bot2_name}\n\n")
             log_file.write(header)
-            i = 0
-            for result in data:
-                log_file.write(f"{result[0]:<{col_width}}|{result[1]:<{col_width}}| {uci_moves_list[i]}\n")
-                i+=1
+            win_count = {bot1_name: 0, bot2_name: 0, "Draw": 0}
+            for record in match_log.records():
+                winner = record['winner']
+                win_count[winner] += 1
+                color = "" if winner == "Draw" else ("White" if winner == record['white'] else "Black")
+                log_file.write(f"{' ' + winner:<{col_width}}|{' ' + color:<{col_width}}| {record['moves']}\n")
             # Write win count summary
             log_file.write(f"\n{bot1_name}: {win_count[bot1_name]}\n")
             log_file.write(f"{bot2_name}: {win_count[bot2_name]}\n")
             log_file.write(f"Draws: {win_count['Draw']}\n")
             log_file.write('-' * (col_width * 3 + 2) + '\n')  # Add a separator line
 
-    def start_game(self, bot1, bot2, bot1_name, bot2_name, visual=False, bot1_white=True):
+    def start_game(self, bot1, bot2, bot1_name, bot2_name, visual=False, bot1_white=True, clock=None,
+                   adjudicator=None):
+        """
+        plays one game between two bots
+        @param clock: optional (base, increment) time control in seconds, a bot that runs out of time loses
+        @param adjudicator: optional Adjudicator, ends the game early once the bots' scores agree on the result
+        """
         current_bot = bot1 if bot1_white else bot2  # allows for order of start to change, more variety
         next_bot = bot2 if bot1_white else bot1
         current_bot_name = bot1_name if bot1_white else bot2_name
         next_bot_name = bot2_name if bot1_white else bot1_name
+        time_left = {bot1_name: clock[0], bot2_name: clock[0]} if clock else None
+        self.time_used = {bot1_name: 0.0, bot2_name: 0.0}
+        self.termination = None
+        if adjudicator is not None:
+            adjudicator.reset()
         while True:
-            game_ended = current_bot()
+            start = time.time()
+            if clock:
+                game_ended = current_bot(time_left=time_left[current_bot_name], increment=clock[1])
+            else:
+                game_ended = current_bot()
+            elapsed = time.time() - start
+            self.time_used[current_bot_name] += elapsed
+            if clock:
+                time_left[current_bot_name] -= elapsed
+                if time_left[current_bot_name] < 0:  # flagged, the opponent wins on time
+                    self.termination = "time_forfeit"
+                    return next_bot_name
+                time_left[current_bot_name] += clock[1]
             if game_ended:
+                outcome = self.game.outcome
+                self.termination = outcome.termination.name.lower()
                 # print(current_bot_name, "had last move")  # helping me detect likelihood a bot will draw
-                winner = current_bot_name if self.game.board.is_checkmate() else "Draw"
+                winner = current_bot_name if outcome.winner is not None else "Draw"
                 if visual:
                     self.renderer.game_ended = True
                     self.renderer.update_screen()
                     self.renderer.game_ended = False
                 return winner
+            if adjudicator is not None:
+                # the bot's score of the move it just made, move methods are bound to their bot
+                eval = getattr(getattr(current_bot, '__self__', None), 'best_eval', None)
+                adjudicated = adjudicator.update(self.game.board, eval)
+                if adjudicated is not None:
+                    winner_color, self.termination = adjudicated
+                    if winner_color is None:
+                        return "Draw"
+                    # the mover is the side not to move
+                    return current_bot_name if winner_color != self.game.board.turn else next_bot_name
             # Swap bots and their names for the next turn
             current_bot, next_bot = next_bot, current_bot
             current_bot_name, next_bot_name = next_bot_name, current_bot_name
             if visual:
                 self.renderer.update_screen()
 
-    def run_simulations(self, num_games, bot1, bot2, visual=False):
+    def run_simulations(self, num_games, bot1, bot2, visual=False, clock=None, telemetry=False, log_path=None, seed=0,
+                        resume=False, sprt=None, adjudicator=None, results=None, bot_specs=None):
+        """
+        @param bot1, bot2: engines to play, the ones with a close() are closed once the match is over
+        @param telemetry: append the per-move search stats of bots that keep them as JSON lines next to the results
+        @param log_path: match log every finished game is appended to, see open_log
+        @param seed: game i is played with random seed seed + i, so a run can be repeated
+        @param resume: carry on the run in log_path, skipping the games it already has
+        @param sprt: SPRT that ends the run early, num_games is then the most it plays
+        @param adjudicator: Adjudicator that ends decided games early
+        @param results: ResultsStore the run, its games and their search stats are also written to
+        @param bot_specs: (name, kwargs) the bots were built with, kept in the manifest so --resume can build them
+        again. Without them the manifest records unknown kwargs and the log can't be resumed from the command line
+        @return: win count of the whole run, resumed games included
+        """
         # initialize bot information
         bot1_name = bot1.__class__.__name__
         bot2_name = bot2.__class__.__name__
         if bot1_name == bot2_name:
             bot2_name += "(1)"
+        if telemetry:
+            for bot, name in ((bot1, bot1_name), (bot2, bot2_name)):
+                if hasattr(bot, 'telemetry'):
+                    bot.telemetry.path = os.path.join('simulation_results',
+                                                      f"{bot1_name}_vs_{bot2_name}_{name}_telemetry.jsonl")
+        bot1_spec, bot2_spec = bot_specs or ((bot1.__class__.__name__, None), (bot2.__class__.__name__, None))
+        manifest = {'bot1': list(bot1_spec), 'bot2': list(bot2_spec), 'games': num_games, 'seed': seed, 'clock': clock,
+                    'start_fens': None, 'sprt': sprt.settings() if sprt else None,
+                    'adjudication': adjudicator.settings() if adjudicator else None}
+        match_log = self.open_log(bot1_name, bot2_name, log_path, resume, manifest)
+        if results is not None:
+            results.start_run(bot1_name, bot2_name, manifest, match_log.path)
+        done = match_log.completed()
+        if sprt is not None:  # games of the interrupted run count towards the test
+            for record in match_log.records():
+                self.add_to_sprt(sprt, record, bot1_name)
         bot1_move = bot1.move
         bot2_move = bot2.move
         if visual:  # sets up renderer to show the game
             self.renderer = SimulationRenderer(self.game)
-        data = []
-        uci_moves_list = []
-        win_count = {bot1_name: 0, bot2_name: 0, "Draw": 0}
-        bot1_white = True
         for i in range(num_games):
+            if i in done:
+                continue
+            if sprt is not None and sprt.status() is not None:
+                break
+            bot1_white = i % 2 == 0  # switch bots color every game
             if visual:  # update color of bot in simulation
                 self.renderer.bot1_white = bot1_white
-            if bot1_white:
-                color = {bot1_name: "White", bot2_name: "Black", "Draw": ""}
-            else:
-                color = {bot1_name: "Black", bot2_name: "White", "Draw": ""}
+            random.seed(seed + i)
             # play game
-            winner = self.start_game(bot1_move, bot2_move, bot1_name, bot2_name, visual, bot1_white)
-            # record stats, (winner, color, list of moves)
-            win_count[winner] += 1
-            data.append([" " + winner, " " + color[winner]])
-            game = chess.pgn.Game.from_board(self.game.board)
-            uci_moves = []
-            for move in game.mainline_moves():
-                uci_moves.append(move.uci())
-            uci_moves_list.append(uci_moves)
-            # reset bots and game, switch bots color
+            winner = self.start_game(bot1_move, bot2_move, bot1_name, bot2_name, visual, bot1_white, clock,
+                                     adjudicator)
+            # record it straight away, (winner, colors, moves, timing)
+            white, black = (bot1_name, bot2_name) if bot1_white else (bot2_name, bot1_name)
+            record = game_record(i, seed + i, white, black, winner, self.game.board, self.termination, self.time_used)
+            match_log.append(record)
+            if results is not None:
+                results.add_game(record, self.game_stats((bot1, bot2)))
+            self.add_to_sprt(sprt, record, bot1_name)
+            # reset bots and game
             bot1.reset()
             bot2.reset()
             self.game.restart()
-            bot1_white = not bot1_white
         # finally, record all the results in a file
-        self.log_results(bot1_name, bot2_name, data, win_count, uci_moves_list)
+        self.log_results(bot1_name, bot2_name, match_log)
+        for bot in (bot1, bot2):  # Lazy SMP helpers and shared tables outlive the match otherwise
+            if hasattr(bot, 'close'):
+                bot.close()
+        if results is not None:
+            results.flush()
+        return match_log.win_count(bot1_name, bot2_name)
 
+    def run_parallel_simulations(self, num_games, bot1, bot2, jobs=None, clock=None, seed=0, start_fens=None,
+                                 log_path=None, resume=False, sprt=None, adjudicator=None, results=None):
+        """
+        Same match as run_simulations, but every game is a job for a pool of worker processes, which build their
+        own Game and fresh engines. Every game is logged as soon as it finishes, in whatever order they finish.
+        @param bot1, bot2: engine names from ENGINES, or (name, kwargs) to construct the engine with arguments
+        @param jobs: number of worker processes, defaults to the number of cores
+        @param seed: game i is played with random seed seed + i, so a run can be repeated
+        @param start_fens: optional start positions, each is played twice so both bots get both colors
+        @param log_path, resume, sprt, adjudicator, results: as for run_simulations
+        """
+        bot1_name, bot2_name, match_log, game_jobs = self.plan_jobs(num_games, bot1, bot2, clock, seed, start_fens,
+                                                                     log_path, resume, sprt, adjudicator, results)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(play_game_job, job) for job in game_jobs]
+            for future in as_completed(futures):  # a slow game doesn't hold back the ones after it
+                record, stats = future.result()
+                match_log.append(record)
+                if results is not None:
+                    results.add_game(record, stats)
+                if self.add_to_sprt(sprt, record, bot1_name):
+                    executor.shutdown(wait=False, cancel_futures=True)  # running games finish, but aren't logged
+                    break
+        self.log_results(bot1_name, bot2_name, match_log)
+        if results is not None:
+            results.flush()
+        return match_log.win_count(bot1_name, bot2_name)
 
-if __name__ == "__main__":
+    def plan_jobs(self, num_games, bot1, bot2, clock=None, seed=0, start_fens=None, log_path=None, resume=False,
+                  sprt=None, adjudicator=None, results=None):
+        """
+        Opens the match log of a run that plays its games outside this process, and lists the games still to play
+        @param results: ResultsStore the run is registered in, the caller adds the games
+        @return: bot1 name, bot2 name, the match log and the jobs for play_game_job
+        """
+        bot1 = (bot1, {}) if isinstance(bot1, str) else bot1
+        bot2 = (bot2, {}) if isinstance(bot2, str) else bot2
+        bot1_name, bot2_name = bot1[0], bot2[0]
+        if bot1_name == bot2_name:
+            bot2_name += "(1)"
+        adjudication = adjudicator.settings() if adjudicator else None  # jobs carry settings, workers build their own
+        manifest = {'bot1': list(bot1), 'bot2': list(bot2), 'games': num_games, 'seed': seed, 'clock': clock,
+                    'start_fens': start_fens, 'sprt': sprt.settings() if sprt else None,
+                    'adjudication': adjudication}
+        match_log = self.open_log(bot1_name, bot2_name, log_path, resume, manifest)
+        if results is not None:
+            results.start_run(bot1_name, bot2_name, manifest, match_log.path)
+        done = match_log.completed()
+        if sprt is not None:  # games of the interrupted run count towards the test
+            for record in match_log.records():
+                self.add_to_sprt(sprt, record, bot1_name)
+        game_jobs = []
+        for i in range(num_games):
+            if i in done:
+                continue
+            start_fen = start_fens[(i // 2) % len(start_fens)] if start_fens else None
+            game_jobs.append((i, bot1, bot2, bot1_name, bot2_name, i % 2 == 0, seed + i, start_fen, clock,
+                              adjudication))
+        if sprt is not None and sprt.status() is not None:  # decided before the run was interrupted
+            game_jobs = []
+        return bot1_name, bot2_name, match_log, game_jobs
+
+
+def play_game_job(job):
+    """
+    Worker process side of run_parallel_simulations, plays one game with freshly built engines
+    @return: the game's match log record, and the SearchStats of its moves as dicts
+    """
+    index, bot1_spec, bot2_spec, bot1_name, bot2_name, bot1_white, seed, start_fen, clock, adjudication = job
+    random.seed(seed)
     simulate = Simulate()
-    mode = 'nvisual'
-    visual = mode == 'visual'
-    bot_1 = v2_Eval(simulate.game)
-    bot_2 = v3_Minimax(simulate.game)
+    if start_fen is not None:
+        simulate.game.board = chess.Board(start_fen)
+        simulate.game.repetitions.reset(simulate.game.board)
+    bot1 = ENGINES[bot1_spec[0]](simulate.game, **bot1_spec[1])
+    bot2 = ENGINES[bot2_spec[0]](simulate.game, **bot2_spec[1])
+    adjudicator = Adjudicator(**adjudication) if adjudication else None
+    winner = simulate.start_game(bot1.move, bot2.move, bot1_name, bot2_name, False, bot1_white, clock, adjudicator)
+    for bot in (bot1, bot2):
+        if hasattr(bot, 'close'):
+            bot.close()
+    white, black = (bot1_name, bot2_name) if bot1_white else (bot2_name, bot1_name)
+    record = game_record(index, seed, white, black, winner, simulate.game.board, simulate.termination,
+                         simulate.time_used, start_fen)
+    return record, Simulate.game_stats((bot1, bot2))
 
-    simulate.run_simulations(10, bot_1, bot_2, visual=visual)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a match between two engines")
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--bot1', default='v2_Eval', choices=list(ENGINES))
+    parser.add_argument('--bot2', default='v3_Minimax', choices=list(ENGINES))
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes, games run in parallel above 1")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clock', type=float, nargs=2, metavar=('BASE', 'INC'), help="time control in seconds")
+    parser.add_argument('--visual', action='store_true')
+    parser.add_argument('--log', help="match log to write, named after the bots and start time by default")
+    parser.add_argument('--resume', metavar='LOG', help="finish the run of an earlier match log, with its settings")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once bot1 is shown to be ELO0 or ELO1 stronger, --games is then the maximum")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    add_adjudication_arguments(parser)
+    parser.add_argument('--db', help="SQLite results database the run is also written to")
+    parser.add_argument('--telemetry', action='store_true',
+                        help="append every move's search stats to a JSON lines file per bot in simulation_results")
+    args = parser.parse_args()
+
+    simulate = Simulate()
+    bot1, bot2 = (args.bot1, {}), (args.bot2, {})
+    games, seed, start_fens, log_path = args.games, args.seed, None, args.log
+    clock = tuple(args.clock) if args.clock else None
+    sprt = SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    adjudication = adjudication_settings(args)
+    if args.telemetry and args.jobs > 1:
+        parser.error("--telemetry needs --jobs 1, parallel runs keep their search stats with --db")
+    if args.log and os.path.exists(args.log):
+        parser.error(f"{args.log} already exists, use --resume {args.log} to finish it")
+    if args.resume:
+        try:
+            bot1, bot2, games, seed, start_fens, clock, sprt_settings, adjudication = resume_settings(args.resume)
+        except ValueError as error:
+            parser.error(str(error))
+        log_path = args.resume
+        sprt = SPRT(*sprt_settings) if sprt_settings else None
+    adjudicator = Adjudicator(**adjudication) if adjudication else None
+    results = ResultsStore(args.db) if args.db else None
+    if args.jobs > 1:
+        win_count = simulate.run_parallel_simulations(games, bot1, bot2, jobs=args.jobs, clock=clock, seed=seed,
+                                                      start_fens=start_fens, log_path=log_path,
+                                                      resume=bool(args.resume), sprt=sprt, adjudicator=adjudicator,
+                                                      results=results)
+    else:
+        bot_1 = ENGINES[bot1[0]](simulate.game, **bot1[1])
+        bot_2 = ENGINES[bot2[0]](simulate.game, **bot2[1])
+        win_count = simulate.run_simulations(games, bot_1, bot_2, visual=args.visual, clock=clock,
+                                             telemetry=args.telemetry, log_path=log_path,
+                                             seed=seed, resume=bool(args.resume), sprt=sprt, adjudicator=adjudicator,
+                                             results=results, bot_specs=(bot1, bot2))
+    if results is not None:
+        results.close()
+    print(win_count)
+    if sprt is not None:
+        print(sprt.report())
 
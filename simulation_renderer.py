@@ -4,19 +4,12 @@ import keyboard
 import time
 
 from engines.v1_random import v1_Random
+from board_view import BoardView, SCREEN_WIDTH, SQUARE_SIZE, centered, popup_surface
 from game import Game
 
-SCREEN_WIDTH = 640
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
-LIGHT_BROWN = (237, 214, 176, 255)
-DARK_BROWN = (184, 135, 98, 255)
-DARK_HIGHLIGHT_COLOR = (224, 196, 76)
-LIGHT_HIGHLIGHT_COLOR = (248, 236, 116)
-SQUARE_SIZE = 80
 MOVE_DELAY = 0
-restart_button_rect = None
-quit_button_rect = None
 
 
 def load_pieces():
@@ -56,11 +49,10 @@ class SimulationRenderer:
         self.move_from = None
         self.move_to = None
         self.piece_images = load_pieces()
-
-    @staticmethod
-    def draw_highlight(screen, square, highlight, col, row):
-        """Helper function to draw highlights on the board."""
-        pygame.draw.rect(screen, highlight, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+        self.view = BoardView(self.screen, self.piece_images)
+        self.font = pygame.font.Font(None, 50)
+        self.game_end_popup = popup_surface(self.font, "Game Over")
+        self.pause_text = self.font.render("paused", True, WHITE)
 
     def get_square_from_pos(self, pos):
         """Convert pixel position to chessboard square."""
@@ -71,82 +63,31 @@ class SimulationRenderer:
             row = 7 - row
         return chess.square(col, row)
 
-    def draw_game_end_popup(self):
-        # Define popup dimensions and colors
-        global restart_button_rect, quit_button_rect
-        rect_width = 300
-        rect_height = 125
-        rect_x = SCREEN_WIDTH / 2 - rect_width / 2
-        rect_y = SCREEN_WIDTH / 2 - rect_height / 2
-        popup_color = (0, 0, 0, 128)  # (R, G, B, A) with A = 128 for 50% transparency
-        border_color = (255, 255, 255)
-        text_color = (255, 255, 255)
-
-        # Create a surface for the popup with an alpha channel (RGBA)
-        popup_surface = pygame.Surface((rect_width, rect_height), pygame.SRCALPHA)
-        popup_surface.fill(popup_color)
-        self.screen.blit(popup_surface, (rect_x, rect_y))
-        pygame.draw.rect(self.screen, border_color, (rect_x, rect_y, rect_width, rect_height), 5)
-
-        font = pygame.font.Font(None, 50)
-        game_over_text = font.render("Game Over", True, text_color)
-        self.screen.blit(game_over_text, (rect_x + rect_width / 2 - game_over_text.get_width() / 2,
-                                          rect_y + rect_height / 2 - game_over_text.get_height() / 2))
-
     def draw_board(self, screen):
-        """Draw the chessboard and pieces."""
-        for row in range(8):
-            for col in range(8):
-                if self.bot1_white:
-                    square = chess.square(col, 7 - row)
-                else:
-                    square = chess.square(col, row)
-                if (row + col) % 2 == 0:  # light square
-                    color = LIGHT_BROWN
-                    highlight = LIGHT_HIGHLIGHT_COLOR
-                else:
-                    color = DARK_BROWN
-                    highlight = DARK_HIGHLIGHT_COLOR
-
-                # draws board
-                pygame.draw.rect(screen, color, pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE,
-                                                            SQUARE_SIZE))
-
-                # draws highlighted squares
-                highlights = [
-                    (self.move_to and self.move_to == square, highlight),
-                    (self.move_from and self.move_from == square, highlight)]
-                for condition, highlight_color in highlights:
-                    if condition:
-                        self.draw_highlight(screen, square, highlight_color, col, row)
-
-                # Draw pieces
-                piece = self.chessboard.get_piece(square)
-                if piece:
-                    piece_image = self.piece_images[piece.symbol()]
-                    screen.blit(piece_image, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-
+        """Draw the squares that changed since the last frame, the game over popup and the pause text."""
+        highlighted = {square for square in (self.move_from, self.move_to) if square is not None}
+        overlays = []
         if self.game_ended:
-            self.draw_game_end_popup()
+            overlays.append((self.game_end_popup, centered(self.game_end_popup)))
         if self.pause:
-            self.display_pause_text()
+            overlays.append((self.pause_text, centered(self.pause_text)))
+        self.view.render(self.chessboard.board, not self.bot1_white, highlighted, overlays=overlays)
 
     def update_screen(self):
-        self.screen.fill(BLACK)
         self.handle_events()
         self.handle_keyboard_events()
         self.update_last_move()
-        self.draw_board(self.screen)
-        pygame.display.flip()
+        self.draw_board(self.screen)  # updates only the dirty parts of the window
         if not self.pause:
             self.delay_game()  # allows time after each move, can use keyboard controls
 
-    @staticmethod
-    def handle_events():
+    def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
+            if event.type == pygame.WINDOWEXPOSED:  # window contents were lost, redraw all of it
+                self.view.invalidate()
 
     def handle_keyboard_events(self):
         """
@@ -208,16 +149,13 @@ class SimulationRenderer:
             if elapsed_time > duration:
                 break
 
-    def display_pause_text(self):
-        font = pygame.font.Font(None, 50)
-        pause_text = font.render("paused", True, (255, 255, 255))
-        location = (SCREEN_WIDTH / 2 - pause_text.get_width() / 2,
-                    SCREEN_WIDTH / 2 - pause_text.get_height() / 2)
-        self.screen.blit(pause_text, location)
-
 
-def replay_game(uci_moves):
+def replay_game(uci_moves, start_fen=None):
+    """@param start_fen: position the moves are played from, None for the standard one"""
     rend = SimulationRenderer()
+    if start_fen is not None:
+        rend.chessboard.board = chess.Board(start_fen)
+        rend.chessboard.repetitions.reset(rend.chessboard.board)
     i = 0
     while True:
         if i > len(uci_moves)-1:
@@ -0,0 +1,51 @@
+import argparse
+import time
+
+import chess
+
+from game import Game
+from v3_minimax import v3_Minimax
+
+# middlegame positions with plenty of moves, searched from an empty table each time
+SCALING_FENS = [
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N2N2/PP2BPPP/R2QKB1R w KQ - 0 8",
+]
+
+
+def run_scaling(worker_counts, depth, hash_size_mb):
+    """
+    Searches every position to a fixed depth with each number of processes
+    @return: list of (workers, total nodes, nodes/sec, average time to depth) rows
+    """
+    rows = []
+    for workers in worker_counts:
+        game = Game()
+        total_nodes = 0
+        total_time = 0
+        with v3_Minimax(game, hash_size_mb=hash_size_mb, depth=depth, threads=workers) as engine:
+            for fen in SCALING_FENS:
+                engine.tt.clear()
+                game.board = chess.Board(fen)
+                start = time.time()
+                engine.move()
+                total_time += time.time() - start
+                total_nodes += engine.positions_evaluated + engine.qnodes + engine.helper_nodes
+        rows.append((workers, total_nodes, total_nodes / total_time, total_time / len(SCALING_FENS)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lazy SMP scaling report for v3_Minimax")
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--hash', type=int, default=64, help="transposition table size in MB")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'Workers':>8} | {'Nodes':>10} | {'Nodes/sec':>10} | {'Time to depth ' + str(args.depth):>16} | Speedup")
+    base_time = None
+    for workers, nodes, nps, time_to_depth in run_scaling(args.workers, args.depth, args.hash):
+        base_time = base_time or time_to_depth
+        print(f"{workers:>8} | {nodes:>10} | {nps:>10.0f} | {time_to_depth:>15.2f}s | {base_time / time_to_depth:.2f}x")
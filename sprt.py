@@ -0,0 +1,111 @@
+import math
+
+PAIR_SCORES = [0, 0.25, 0.5, 0.75, 1]  # bot1's score over a color reversed pair of games, scaled to 0..1
+PRIOR = 1e-3  # added to every pentanomial count when estimating, so unseen outcomes don't make the test degenerate
+
+
+def elo_to_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score):
+    if score <= 0 or score >= 1:  # only losses or only wins, no finite estimate
+        return math.copysign(math.inf, score - 0.5)
+    return -400 * math.log10(1 / score - 1)
+
+
+def constrained_probabilities(probabilities, target):
+    """
+    Most likely pentanomial distribution with the given expected score, the maximum likelihood estimate under
+    a hypothesis: p_i = q_i / (1 + x (s_i - target)), with x found by bisection so that the mean is the target
+    """
+    def mean_error(x):
+        return sum(q * (s - target) / (1 + x * (s - target)) for q, s in zip(probabilities, PAIR_SCORES))
+
+    # 1 + x (s - target) has to stay positive for every score
+    low = -1 / (PAIR_SCORES[-1] - target) + 1e-12
+    high = -1 / (PAIR_SCORES[0] - target) - 1e-12
+    for _ in range(100):  # mean_error decreases in x
+        middle = (low + high) / 2
+        if mean_error(middle) > 0:
+            low = middle
+        else:
+            high = middle
+    x = (low + high) / 2
+    return [q / (1 + x * (s - target)) for q, s in zip(probabilities, PAIR_SCORES)]
+
+
+class SPRT:
+    def __init__(self, elo0=0, elo1=5, alpha=0.05, beta=0.05):
+        """
+        Sequential probability ratio test of H0: bot1 is elo0 stronger than bot2, against H1: elo1 stronger.
+        Games are counted in color reversed pairs (pentanomial), which removes most of the variance that comes
+        from playing white or black, and from the start position when pairs share one.
+        @param alpha: chance of accepting H1 when H0 holds
+        @param beta: chance of accepting H0 when H1 holds
+        """
+        self.elo0, self.elo1, self.alpha, self.beta = elo0, elo1, alpha, beta
+        self.lower = math.log(beta / (1 - alpha))  # accept H0 below
+        self.upper = math.log((1 - beta) / alpha)  # accept H1 above
+        self.pentanomial = [0] * 5  # pairs by bot1's points: 0, 0.5, 1, 1.5, 2
+        self.pending = {}  # pair number: bot1's score of the game whose partner hasn't finished
+
+    def settings(self):
+        return [self.elo0, self.elo1, self.alpha, self.beta]
+
+    def add_game(self, game, score):
+        """
+        @param game: index in the run, games 2k and 2k + 1 form a pair
+        @param score: bot1's score, 1, 0.5 or 0
+        """
+        pair = game // 2
+        if pair in self.pending:
+            self.pentanomial[int((self.pending.pop(pair) + score) * 2)] += 1
+        else:
+            self.pending[pair] = score
+
+    def pairs(self):
+        return sum(self.pentanomial)
+
+    def probabilities(self):
+        total = self.pairs() + PRIOR * len(self.pentanomial)
+        return [(count + PRIOR) / total for count in self.pentanomial]
+
+    def llr(self):
+        """Log likelihood ratio of H1 over H0, generalized to the pentanomial model"""
+        if not self.pairs():
+            return 0.0
+        probabilities = self.probabilities()
+        p0 = constrained_probabilities(probabilities, elo_to_score(self.elo0))
+        p1 = constrained_probabilities(probabilities, elo_to_score(self.elo1))
+        return sum(count * math.log(a / b) for count, a, b in zip(self.pentanomial, p1, p0) if count)
+
+    def status(self):
+        """'H1' or 'H0' once a bound is crossed, else None"""
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def elo(self):
+        """
+        Elo estimate of bot1 over bot2 with its 95% error bars
+        @return: (elo, low, high)
+        """
+        pairs = self.pairs()
+        if not pairs:
+            return 0.0, -math.inf, math.inf
+        mean = sum(count * s for count, s in zip(self.pentanomial, PAIR_SCORES)) / pairs
+        variance = sum(count * (s - mean) ** 2 for count, s in zip(self.pentanomial, PAIR_SCORES)) / pairs
+        error = 1.96 * math.sqrt(variance / pairs)
+        return score_to_elo(mean), score_to_elo(mean - error), score_to_elo(mean + error)
+
+    def report(self):
+        elo, low, high = self.elo()
+        result = {'H1': "H1 accepted", 'H0': "H0 accepted", None: "undecided"}[self.status()]
+        return (f"SPRT [{self.elo0}, {self.elo1}] alpha {self.alpha} beta {self.beta}: "
+                f"LLR {self.llr():.2f} ({self.lower:.2f}, {self.upper:.2f}), {result}\n"
+                f"Elo {elo:.1f} [{low:.1f}, {high:.1f}] over {self.pairs()} pairs, "
+                f"pentanomial {self.pentanomial}")
@@ -0,0 +1,269 @@
+import argparse
+import contextlib
+import io
+import subprocess
+import sys
+import threading
+import time
+
+import chess
+
+from engines.bitboard import move_uci
+from engines.transposition import TranspositionTable
+from engines.v1_random import v1_Random
+from engines.v2_eval import v2_Eval
+from game import Game
+from v3_minimax import v3_Minimax, MATE_SCORE, MAX_DEPTH
+
+ENGINES = {'v1_Random': v1_Random, 'v2_Eval': v2_Eval, 'v3_Minimax': v3_Minimax}
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+CHECK_TIMEOUT = 30  # seconds the pipe check gives the engine to answer and quit
+
+
+class UciEngine:
+    def __init__(self, engine_name='v3_Minimax', output=None):
+        """
+        Universal Chess Interface front-end, so GUIs and match tools can run the engines as a separate process.
+        Searches run on a background thread, the command loop keeps answering isready and stop meanwhile.
+        @param engine_name: one of ENGINES, can also be changed with the Engine option
+        @param output: stream the protocol is written to, stdout by default
+        """
+        self.output = output or sys.stdout  # kept, so redirecting stdout around chatty engines doesn't catch it
+        self.lock = threading.Lock()
+        self.game = Game()
+        self.engine_name = engine_name
+        self.hash_size_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.engine = None
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.create_engine()
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def create_engine(self):
+        if self.engine is not None and hasattr(self.engine, 'close'):
+            self.engine.close()
+        if self.engine_name == 'v3_Minimax':
+            self.engine = v3_Minimax(self.game, hash_size_mb=self.hash_size_mb, threads=self.threads)
+            if self.threads > 1:  # forked here, on the main thread, never from the search thread
+                self.engine.start_workers()
+        else:
+            self.engine = ENGINES[self.engine_name](self.game)
+
+    # ---------- commands ----------
+
+    def handle(self, line):
+        """
+        Runs one command line
+        @return: False once the engine should quit
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        try:
+            return self.run_command(command, args)
+        except ValueError as error:  # malformed option value, bad FEN or illegal move, the command is ignored
+            self.send(f"info string ignored {line.strip()}: {error}")
+            return True
+
+    def run_command(self, command, args):
+        if command == 'uci':
+            self.send(f"id name ChessBot {self.engine_name}")
+            self.send("id author ChessBot")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name Engine type combo default v3_Minimax " + " ".join(f"var {name}" for name in ENGINES))
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            if hasattr(self.engine, 'tt'):
+                self.engine.tt.clear()
+            self.game.board = chess.Board()
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            if hasattr(self.engine, 'close'):
+                self.engine.close()
+            return False
+        return True  # unknown commands are ignored, as the protocol asks
+
+    def set_option(self, args):
+        """setoption name <name> value <value>"""
+        if 'name' not in args:
+            return
+        value_at = args.index('value') if 'value' in args else len(args)
+        name = " ".join(args[args.index('name') + 1:value_at]).lower()
+        value = " ".join(args[value_at + 1:])
+        if name == 'hash':
+            self.hash_size_mb = max(1, min(MAX_HASH_MB, int(value)))
+            if isinstance(getattr(self.engine, 'tt', None), TranspositionTable):  # no need to restart the engine
+                self.engine.tt.resize(self.hash_size_mb)
+                self.engine.hash_size_mb = self.hash_size_mb
+                return
+        elif name == 'threads':
+            self.threads = max(1, min(MAX_THREADS, int(value)))
+        elif name == 'engine' and value in ENGINES:
+            self.engine_name = value
+        else:
+            return
+        self.create_engine()
+
+    def set_position(self, args):
+        """position startpos | fen <fen> [moves <move> ...]"""
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'fen':
+            board = chess.Board(" ".join(args[1:moves_at]))
+        else:
+            board = chess.Board()
+        for uci in args[moves_at + 1:]:
+            board.push_uci(uci)
+        self.game.board = board
+
+    def go(self, args):
+        """go [depth N] [nodes N] [movetime ms] [wtime ms btime ms winc ms binc ms] [infinite]"""
+        limits = {}
+        for i, token in enumerate(args):
+            if token == 'infinite':
+                limits['infinite'] = True
+            elif token in ('depth', 'nodes', 'movetime', 'wtime', 'btime', 'winc', 'binc') and i + 1 < len(args):
+                limits[token] = int(args[i + 1])
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(self.game.board.copy(), limits), daemon=True)
+        self.search_thread.start()
+
+    def stop(self):
+        """Ends a running search, which still answers with its bestmove, and waits for it"""
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    # ---------- search thread ----------
+
+    def search(self, board, limits):
+        if not any(board.legal_moves):
+            self.send("bestmove 0000")
+            return
+        if isinstance(self.engine, v3_Minimax):
+            move = self.search_v3(board, limits)
+        else:
+            self.game.board = board.copy()
+            with contextlib.redirect_stdout(io.StringIO()):  # keeps engine prints off the protocol
+                self.engine.move()
+            move = self.game.board.pop()
+            self.game.board = board
+        if move is None:  # stopped before the first iteration finished
+            move = next(iter(board.legal_moves))
+        if limits.get('infinite'):  # the protocol only allows bestmove after stop
+            self.stop_event.wait()
+        self.send(f"bestmove {move.uci()}")
+
+    def search_v3(self, board, limits):
+        engine = self.engine
+        white = board.turn == chess.WHITE
+        time_left = limits.get('wtime' if white else 'btime')
+        increment = limits.get('winc' if white else 'binc', 0)
+        engine.depth = limits.get('depth') or MAX_DEPTH
+        engine.movetime = limits['movetime'] / 1000 if 'movetime' in limits else None
+        engine.max_nodes = limits.get('nodes')
+        engine.stop_event = self.stop_event
+        start = time.time()
+
+        def info(depth, eval, best_move):
+            elapsed = time.time() - start
+            nodes = engine.positions_evaluated + engine.qnodes + engine.running_helper_nodes()
+            if abs(eval) >= MATE_SCORE:  # mates aren't scored by distance, the depth bounds it
+                score = f"mate {(depth + 1) // 2 if eval > 0 else -(depth // 2)}"
+            else:
+                score = f"cp {int(eval)}"
+            self.send(f"info depth {depth} seldepth {engine.seldepth} score {score} nodes {nodes} "
+                      f"nps {int(nodes / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)} "
+                      f"hashfull {engine.tt.hashfull()} pv {move_uci(best_move)}")
+
+        engine.on_iteration = info
+        self.game.board = board
+        try:
+            return engine.think(board, time_left / 1000 if time_left is not None else None, increment / 1000)
+        finally:
+            engine.on_iteration = None
+            engine.stop_event = None
+
+
+def check_pipe(threads=2, movetime=500, timeout=CHECK_TIMEOUT):
+    """
+    Drives this script over a pipe the way a GUI does and makes sure a search answers with bestmove and quit exits
+    @return: True if it passed, the engine's output is printed when it didn't
+    """
+    commands = ["uci", f"setoption name Threads value {threads}", "isready", "position startpos",
+                f"go movetime {movetime}"]
+    process = subprocess.Popen([sys.executable, __file__], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    process.stdin.write("\n".join(commands) + "\n")
+    process.stdin.flush()
+    lines = []
+    answered = threading.Event()
+
+    def read():
+        for line in process.stdout:
+            lines.append(line)
+            if line.startswith("bestmove"):
+                answered.set()
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    deadline = time.time() + timeout
+    passed = answered.wait(timeout)  # bestmove has to come before quit is sent, quit alone would stop the search
+    try:
+        process.stdin.write("quit\n")
+        process.stdin.close()
+        process.wait(max(1, deadline - time.time()))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        passed = False
+    reader.join()
+    if not passed or process.returncode != 0 or any("leaked" in line for line in lines):
+        print("".join(lines))
+        return False
+    return True
+
+
+def main(engine_name='v3_Minimax'):
+    uci = UciEngine(engine_name)
+    for line in sys.stdin:
+        if not uci.handle(line.strip()):
+            break
+    else:  # stdin closed without quit, a running search still answers with its bestmove
+        uci.handle('quit')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UCI front-end for the engines")
+    parser.add_argument('--engine', default='v3_Minimax', choices=list(ENGINES))
+    parser.add_argument('--check', type=int, metavar='THREADS',
+                        help="run a search over a pipe with this many threads, fails if bestmove never comes")
+    args = parser.parse_args()
+    if args.check is not None:
+        passed = check_pipe(args.check)
+        print("ok" if passed else "failed")
+        sys.exit(0 if passed else 1)
+    main(args.engine)
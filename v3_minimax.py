@@ -1,115 +1,540 @@
-import cProfile
+import multiprocessing
+import queue
 import random
 import chess
 import time
 
-# Pawn: chess.PAWN (1)
-# Knight: chess.KNIGHT (2)
-# Bishop: chess.BISHOP (3)
-# Rook: chess.ROOK (4)
-# Queen: chess.QUEEN (5)
-# King: chess.KING (6)
-piece_values = {1: 1, 2: 3, 3: 3, 4: 5, 5: 9, 6: 100}
+from engines.bitboard import Position, PAWN, KING, FLAG_EP, SEE_VALUES
+from engines.move_ordering import MoveOrderer
+from engines.tablebase import Tablebases
+from engines.telemetry import SearchStats, Telemetry
+from engines.transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER, UPPER
+
+MATE_SCORE = 1000000
+DRAW_PENALTY = 150  # centipawns, a draw is scored as slightly lost for the side that is ahead
+MAX_DEPTH = 64
+MOVES_TO_GO = 30  # assumed number of moves left in the game when splitting a clock into per-move budgets
+TIME_MARGIN = 0.05  # seconds kept back from every budget for move overhead
+CHECK_TIME_INTERVAL = 255  # nodes between clock checks, must be a power of two minus one
+TB_WIN = MATE_SCORE - 1000  # tablebase wins rank below mates found by the search, faster wins score higher
+TB_BOUND = TB_WIN - 500  # scores beyond this count plies to a tablebase win, see score_to_tt
+# selective search defaults
+NULL_MOVE_REDUCTION = 2  # extra plies taken off the null move search
+NULL_MOVE_MIN_DEPTH = 3  # remaining depth needed to try a null move
+LMR_FULL_DEPTH_MOVES = 3  # moves searched at full depth before later quiet moves get reduced
+LMR_MIN_DEPTH = 3  # remaining depth needed to reduce a move
+LMR_REDUCTION = 1
+DELTA_MARGIN = 200  # centipawns, quiescence skips captures that can't lift the score this close to alpha
+# Lazy SMP
+HELPER_POLL_INTERVAL = 0.1  # seconds between checks that the helpers are still alive while waiting for them
+HELPER_RESULT_TIMEOUT = 2  # seconds after the main search ends before a silent helper's result is given up on
 
 
 class v3_Minimax:
-    def __init__(self, game):
+    def __init__(self, game, hash_size_mb=16, depth=None, movetime=None, orderer=None, threads=1, tt=None,
+                 book=None, tablebases=None, null_move=True, null_move_reduction=NULL_MOVE_REDUCTION,
+                 null_move_min_depth=NULL_MOVE_MIN_DEPTH, lmr=True, lmr_full_depth_moves=LMR_FULL_DEPTH_MOVES,
+                 lmr_min_depth=LMR_MIN_DEPTH, lmr_reduction=LMR_REDUCTION, quiescence=True,
+                 delta_margin=DELTA_MARGIN, telemetry=None):
         """
         Basic Evaluation, prioritizes checkmate, correctly values draws as 0
+        @param hash_size_mb: memory cap of the transposition table, which is kept between moves of a game
+        @param depth: deepest iteration to search, defaults to 4 without a time limit and unlimited with one
+        @param movetime: fixed number of seconds to think per move, used when no clock is passed to move()
+        @param orderer: move ordering stage, defaults to MoveOrderer (hash move, MVV-LVA, killers, history)
+        @param threads: number of processes searching each move (Lazy SMP), helpers share the table through
+        shared memory and are started on the first move, or by start_workers. Start them from the main thread when
+        the process has other threads, forking from a search thread can leave a helper hung
+        @param tt: transposition table to use instead of creating one
+        @param book: OpeningBook to play from before searching, book moves are counted in book_hits
+        @param tablebases: Tablebases probed inside the search once few enough pieces are left
+        @param null_move: null-move pruning, give the opponent a free move and prune if the reduced search still fails
+        high. Skipped in check and when the side to move has only pawns left (zugzwang)
+        @param lmr: late-move reductions, quiet moves ordered late are searched shallower and with a null window first,
+        and searched again at full depth if they beat alpha
+        @param quiescence: resolve captures at the leaves instead of evaluating in the middle of an exchange,
+        quiescence nodes are counted in qnodes, apart from positions_evaluated
+        @param telemetry: Telemetry that gets a SearchStats record for every move, one is created if not given
         """
+        self.telemetry = telemetry or Telemetry()
+        self.book = book
+        self.tablebases = tablebases
+        self.null_move = null_move
+        self.null_move_reduction = null_move_reduction
+        self.null_move_min_depth = null_move_min_depth
+        self.lmr = lmr
+        self.lmr_full_depth_moves = lmr_full_depth_moves
+        self.lmr_min_depth = lmr_min_depth
+        self.lmr_reduction = lmr_reduction
+        self.quiescence = quiescence
+        self.delta_margin = delta_margin
+        self.qnodes = 0
+        self.seldepth = 0
+        self.null_cutoffs = 0
+        self.lmr_researches = 0
+        self.book_hits = 0
+        self.book_move = False  # the last move came from the book
+        self.threads = threads
+        if tt is not None:
+            self.tt = tt
+        elif threads > 1:
+            self.tt = SharedTranspositionTable(hash_size_mb)
+        else:
+            self.tt = TranspositionTable(hash_size_mb)
+        self.hash_size_mb = hash_size_mb
+        self.workers = []
+        self.job_queues = []
+        self.result_queue = None
+        self.stop_event = None  # set by another process or thread to end this search (helpers, UCI stop)
+        self.helper_stop_event = None
+        self.helper_nodes = 0
+        self.node_counts = None  # shared array, every process of a parallel search keeps its node count in it
+        self.worker_index = 0  # this process's slot in node_counts, 0 is the main search
+        self.search_id = 0  # tags helper jobs, so a late result of an earlier search is never taken
+        self.orderer = orderer or MoveOrderer()
+        self.depth = depth
+        self.movetime = movetime
+        self.max_nodes = None  # stop once this many nodes and qnodes are searched, like the time budget
+        self.on_iteration = None  # called with (depth, eval, best move) after every finished iteration
+        self.stop_time = None
+        self.stopped = False
+        self.depth_reached = 0
+        self.iteration_best_move = None
         self.best_move = None
         self.best_eval = None
         self.game = game
-        self.position_counts = {}
-        self.time_and_positions = []
+        self.game_keys = frozenset()  # earlier positions of the game the search could repeat
         self.positions_evaluated = 0
 
-    def move(self):
+    def move(self, time_left=None, increment=0):
         """
         begins search. sets up board and gets legal moves
+        @param time_left: seconds left on this engine's clock, None to use movetime or a fixed depth
+        @param increment: seconds added to the clock after every move
         """
-        # profiler = cProfile.Profile()
-        # profiler.enable()
-        # start = time.time()
+        start = time.time()
         board = self.game.board
-        self.update_position_counts(board)  # update to get opponents moves
-        self.positions_evaluated = 0
-        self.best_move = None
-
-        self.best_eval = self.search(board, ply_remaining=4, ply_from_root=0, alpha=float('-inf'), beta=float('inf'))
+        tt_probes, tt_hits = self.tt.probes, self.tt.hits
+        move = self.think(board, time_left, increment)
 
-        if self.best_move is None:  # if no move happens to be found, use a random one
-            print("random")
+        if move is None:  # if no move happens to be found, use a random one
             moves = list(board.legal_moves)
             random.shuffle(moves)
-            self.best_move = moves[0]
-        board.push(self.best_move)
-
-        self.update_position_counts(board)  # update for this move
-        # end = time.time()
-        # profiler.disable()
-        # profiler.print_stats(sort='time')
-        # self.time_and_positions.append((f'{self.best_move.uci()}, {self.best_eval}', round((end - start), 3), f": {self.positions_evaluated} positions evaluated"))
-        # #print(self.time_and_positions[-1])
+            board.push(moves[0])
+        else:
+            board.push(move)
+
+        self.record_stats(board, start, tt_probes, tt_hits, book=self.book_move)
         return self.game.check_game_state()
 
-    def search(self, board, ply_remaining, ply_from_root, alpha, beta, last_move=None):
+    def think(self, board, time_left=None, increment=0):
+        """
+        Picks a move for the game's board without playing it, from the book if it has one, else by searching
+        @return: chess.Move, or None if no search iteration finished
+        """
+        self.game.repetitions.sync(board)  # update to get opponents moves
+        self.game_keys = self.game.repetitions.reversible_keys()
+        self.positions_evaluated = 0
+        self.qnodes = 0
+        self.helper_nodes = 0  # book moves and searches without helpers report none
+        self.seldepth = 0
+        self.best_move = None
+        self.best_eval = None
+        self.depth_reached = 0
+        self.book_move = False
+
+        if self.book is not None:  # no search needed while still in the book
+            book_move = self.book.pick(board)
+            if book_move is not None:
+                self.book_hits += 1
+                self.book_move = True
+                return book_move
+
+        self.tt.new_search()
+
+        if self.threads > 1:
+            self.parallel_search(board, self.time_budget(time_left, increment))
+        else:
+            self.iterative_deepening(board, self.time_budget(time_left, increment))
+        return Position.to_chess_move(self.best_move) if self.best_move is not None else None
+
+    def record_stats(self, board, start, tt_probes, tt_hits, book=False):
+        """
+        Adds a SearchStats record for the move just pushed on the board
+        @param tt_probes, tt_hits: transposition table counters before the search, the record gets the difference
+        """
+        elapsed = time.time() - start
+        nodes = self.positions_evaluated + self.helper_nodes  # helpers report their qnodes as nodes
+        probes = self.tt.probes - tt_probes
+        hits = self.tt.hits - tt_hits
+        self.telemetry.record(SearchStats(
+            engine=self.__class__.__name__,
+            ply=len(board.move_stack) - 1,
+            move=board.peek().uci(),
+            eval=self.best_eval,
+            depth=self.depth_reached,
+            seldepth=self.seldepth,
+            nodes=nodes,
+            qnodes=self.qnodes,
+            nps=(nodes + self.qnodes) / elapsed if elapsed > 0 else 0.0,
+            first_move_cutoff_rate=0.0 if book else self.orderer.first_move_cutoff_rate(),
+            tt_probes=probes,
+            tt_hits=hits,
+            tt_hit_rate=hits / probes if probes else 0.0,
+            time=elapsed,
+            book=book,
+        ))
+
+    def time_budget(self, time_left, increment):
+        """
+        Seconds to spend on this move, None for no limit
+        a clock is split evenly over the expected remaining moves, plus most of the increment
+        """
+        if time_left is not None:
+            budget = time_left / MOVES_TO_GO + increment * 0.8
+            return max(0.01, min(budget, time_left / 2) - TIME_MARGIN)
+        if self.movetime is not None:
+            return max(0.01, self.movetime - TIME_MARGIN)
+        return None
+
+    def iterative_deepening(self, board, budget, depth_offset=0):
+        """
+        Searches depth 1, 2, 3... until the depth limit or the time budget runs out.
+        Only completed iterations are trusted, an aborted one falls back to the best move of the previous depth,
+        which is also searched first in the next iteration.
+        The tree is searched on a bitboard Position built from the board, best_move is an int move of that Position.
+        @param depth_offset: skip the first iterations, helpers use this to stay ahead of the main search
+        """
+        max_depth = self.depth or (MAX_DEPTH if budget is not None else 4)
+        self.stop_time = time.time() + budget if budget is not None else None
+        self.stopped = False
+        self.depth_reached = 0
+        self.null_cutoffs = 0
+        self.lmr_researches = 0
+        self.orderer.new_search()
+        pos = Position.from_board(board)
+        for depth in range(1 + depth_offset, max_depth + 1):
+            self.iteration_best_move = None
+            eval = self.search(pos, ply_remaining=depth, ply_from_root=0, alpha=float('-inf'), beta=float('inf'))
+            if self.stopped:
+                break
+            self.best_move = self.iteration_best_move
+            self.best_eval = eval
+            self.depth_reached = depth
+            if self.on_iteration is not None:
+                self.on_iteration(depth, eval, self.best_move)
+            if abs(eval) >= MATE_SCORE or self.best_move is None:  # forced mate found, or no legal moves
+                break
+            if self.stop_time is not None and time.time() >= self.stop_time:
+                break
+
+    def check_time(self):
+        """Ends the search once the time or node budget is spent, never before the first iteration has finished"""
+        if self.stop_time is not None and self.best_move is not None and time.time() >= self.stop_time:
+            self.stopped = True
+        if self.max_nodes is not None and self.best_move is not None and \
+                self.positions_evaluated + self.qnodes >= self.max_nodes:
+            self.stopped = True
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+        if self.node_counts is not None:
+            self.node_counts[self.worker_index] = self.positions_evaluated + self.qnodes
+
+    def parallel_search(self, board, budget):
+        """
+        Lazy SMP, every helper process searches the same root with its own depth offset and move order noise,
+        they only cooperate through the shared transposition table.
+        The result of the deepest completed iteration wins, the main search wins ties.
+        Helpers that died or don't answer in time are left out, the main search's result is always there.
+        """
+        self.start_workers()
+        self.helper_stop_event.clear()
+        self.search_id += 1
+        self.node_counts[:] = [0] * len(self.node_counts)
+        fen = board.fen()
+        helpers = [worker for worker in self.workers if worker.is_alive()]
+        for worker_id, (worker, jobs) in enumerate(zip(self.workers, self.job_queues), start=1):
+            if worker.is_alive():
+                jobs.put((fen, self.game_keys, self.depth, budget, self.tt.age, worker_id % 2, self.search_id))
+        self.iterative_deepening(board, budget)
+        self.helper_stop_event.set()
+
+        waiting = len(helpers)
+        deadline = time.time() + HELPER_RESULT_TIMEOUT
+        while waiting:
+            try:
+                search_id, depth_reached, best_move, best_eval, nodes = self.result_queue.get(
+                    timeout=HELPER_POLL_INTERVAL)
+            except queue.Empty:
+                if time.time() >= deadline or not all(worker.is_alive() for worker in helpers):
+                    break
+                continue
+            if search_id != self.search_id:  # given up on in an earlier search
+                continue
+            waiting -= 1
+            self.helper_nodes += nodes
+            if best_move is not None and depth_reached > self.depth_reached:
+                self.depth_reached = depth_reached
+                self.best_move = best_move
+                self.best_eval = best_eval
+
+    def start_workers(self):
+        if self.workers:
+            return
+        self.result_queue = multiprocessing.Queue()
+        self.helper_stop_event = multiprocessing.Event()
+        self.node_counts = multiprocessing.Array('q', self.threads, lock=False)  # torn reads only skew a report
+        for worker_id in range(1, self.threads):
+            jobs = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=lazy_smp_worker, daemon=True,
+                                             args=(worker_id, self.tt.name, self.hash_size_mb, jobs,
+                                                   self.result_queue, self.helper_stop_event, self.node_counts,
+                                                   self.tablebases.directory if self.tablebases else None,
+                                                   self.selectivity()))
+            worker.start()
+            self.job_queues.append(jobs)
+            self.workers.append(worker)
+
+    def running_helper_nodes(self):
+        """Nodes the helpers have searched so far in the running search, as last reported by their clock checks"""
+        return sum(self.node_counts[1:]) if self.node_counts is not None else 0
+
+    def selectivity(self):
+        """Selective search settings as constructor arguments, so helper processes search the same way"""
+        return dict(null_move=self.null_move, null_move_reduction=self.null_move_reduction,
+                    null_move_min_depth=self.null_move_min_depth, lmr=self.lmr,
+                    lmr_full_depth_moves=self.lmr_full_depth_moves, lmr_min_depth=self.lmr_min_depth,
+                    lmr_reduction=self.lmr_reduction, quiescence=self.quiescence, delta_margin=self.delta_margin)
+
+    def close(self):
+        """Stops the helper processes and frees the shared table"""
+        for jobs in self.job_queues:
+            jobs.put(None)
+        for worker in self.workers:
+            worker.join(HELPER_RESULT_TIMEOUT)
+            if worker.is_alive():  # hung helper, it would keep the shared table mapped
+                worker.terminate()
+                worker.join()
+        self.workers = []
+        self.job_queues = []
+        if isinstance(self.tt, SharedTranspositionTable):
+            self.tt.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, pos, ply_remaining, ply_from_root, alpha, beta, allow_null=True):
+        if ply_from_root > self.seldepth:
+            self.seldepth = ply_from_root
         if ply_from_root > 0:
-            if self.evaluate(board) > 0 and (self.is_potential_threefold_repetition(board) or board.is_fifty_moves() or board.is_stalemate()):
-                return -1.5 # discourage draw
+            if pos.evaluate() > 0 and (self.is_potential_threefold_repetition(pos) or pos.is_fifty_moves()):
+                return -DRAW_PENALTY  # discourage draw
+            if self.tablebases is not None and bin(pos.occupied).count('1') <= self.tablebases.max_pieces:
+                result = self.tablebases.probe(pos)
+                if result is not None:
+                    outcome, plies = result
+                    if outcome > 0:
+                        return TB_WIN - ply_from_root - plies
+                    if outcome < 0:
+                        return -(TB_WIN - ply_from_root - plies)
+                    return 0
 
-        moves = sorted(board.legal_moves, key=lambda move: board.is_capture(move), reverse=True)
+        # transposition table, a deep enough stored result can answer this node without searching it
+        key = pos.key
+        hash_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            _, depth, flag, score, hash_move, _ = entry
+            score = score_from_tt(score, ply_from_root)
+            if ply_from_root > 0 and depth >= ply_remaining:
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return beta
+                if flag == UPPER and score <= alpha:
+                    return alpha
 
-        if ply_remaining == 0:  # evaluate
-            return self.evaluate(board)
-        if not moves:
-            if board.is_checkmate():  # checkmate is the worst outcome
-                return float('-1000000')
-            else:  # stalemate, or another form of draw
+        if ply_remaining == 0:  # evaluate, after the captures have played out
+            if self.quiescence:
+                return self.quiescence_search(pos, ply_from_root, alpha, beta)
+            return pos.evaluate()
+
+        in_check = pos.in_check()
+        # null move, if passing still fails high the real moves will too
+        if self.null_move and allow_null and ply_from_root > 0 and ply_remaining >= self.null_move_min_depth and \
+                not in_check and beta < TB_WIN and self.has_pieces(pos) and pos.evaluate() >= beta:
+            pos.make_null()
+            eval = -self.search(pos, max(0, ply_remaining - 1 - self.null_move_reduction), ply_from_root + 1,
+                                -beta, -beta + 1, allow_null=False)
+            pos.unmake_null()
+            if self.stopped:
                 return 0
+            if eval >= beta:
+                self.null_cutoffs += 1
+                return beta
 
-        for move in moves:
-            board.push(move)
+        if ply_from_root == 0 and self.best_move is not None:  # previous iteration's best move goes first
+            hash_move = self.best_move
+
+        best_move = 0
+        move_number = 0
+        reduce = self.lmr and not in_check and ply_remaining >= self.lmr_min_depth
+        for move in self.orderer.order(pos, ply_from_root, hash_move):
+            quiet = not pos.is_noisy(move)
+            if not pos.make(move):  # pseudo-legal move left the king in check
+                continue
             self.positions_evaluated += 1
-            eval = -self.search(board, ply_remaining - 1, ply_from_root + 1, -beta, -alpha)
-            board.pop()
+            if not self.positions_evaluated & CHECK_TIME_INTERVAL:
+                self.check_time()
+            if reduce and quiet and move_number >= self.lmr_full_depth_moves and not pos.in_check():
+                # late quiet move, only prove it can't beat alpha with a shallower null window search
+                depth = max(0, ply_remaining - 1 - self.lmr_reduction)
+                eval = -self.search(pos, depth, ply_from_root + 1, -alpha - 1, -alpha)
+                if eval > alpha and not self.stopped:
+                    self.lmr_researches += 1
+                    eval = -self.search(pos, ply_remaining - 1, ply_from_root + 1, -beta, -alpha)
+            else:
+                eval = -self.search(pos, ply_remaining - 1, ply_from_root + 1, -beta, -alpha)
+            pos.unmake()
+            if self.stopped:  # out of time, this result is incomplete
+                return 0
             # Move was *too* good, opponent will choose a different move earlier on to avoid this position. 'hard pruning'
             if eval >= beta:
+                self.orderer.record_cutoff(pos, move, ply_from_root, ply_remaining, move_number)
+                self.tt.store(key, ply_remaining, LOWER, score_to_tt(beta, ply_from_root), move)
                 return beta
             if eval > alpha:
                 alpha = eval
+                best_move = move
                 if ply_from_root == 0:
-                    self.best_move = move
+                    self.iteration_best_move = move
+            move_number += 1
+
+        if move_number == 0:  # no legal moves
+            if in_check:  # checkmate is the worst outcome
+                return -MATE_SCORE
+            elif ply_from_root > 0 and pos.evaluate() > 0:  # stalemate while ahead
+                return -DRAW_PENALTY  # discourage draw
+            else:
+                return 0
+        self.tt.store(key, ply_remaining, UPPER if not best_move else EXACT, score_to_tt(alpha, ply_from_root),
+                      best_move)
         return alpha
 
+    def quiescence_search(self, pos, ply_from_root, alpha, beta):
+        """
+        Captures only search below the leaves, so a leaf is never scored halfway through an exchange.
+        The side to move can stand pat on the static evaluation instead of capturing, unless it is in check,
+        then every evasion is searched. Captures that lose material by static exchange evaluation, or that
+        can't reach alpha even with the captured piece and a margin added (delta pruning), aren't played.
+        """
+        if ply_from_root > self.seldepth:
+            self.seldepth = ply_from_root
+        in_check = pos.in_check()
+        if in_check:
+            moves = self.orderer.order(pos, ply_from_root)
+            stand_pat = None
+        else:
+            stand_pat = pos.evaluate()
+            if stand_pat >= beta:
+                return beta
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = self.orderer.order_noisy(pos)
 
-    @staticmethod
-    def evaluate(board):
-        piece_map = board.piece_map()
-        score = 0
-        for square, piece in piece_map.items():
-            # Add or subtract piece value depending on color
-            value = piece_values[piece.piece_type]
-            if piece.color == chess.WHITE:
-                score += value
-            else:
-                score -= value
-        eval = score if board.turn else -score
-        return eval
+        squares = pos.squares
+        legal_moves = 0
+        for move in moves:
+            if stand_pat is not None:
+                victim = PAWN if move >> 15 == FLAG_EP else squares[(move >> 6) & 63] & 7
+                if not (move >> 12) & 7 and stand_pat + SEE_VALUES[victim] + self.delta_margin <= alpha:
+                    continue  # delta pruning
+                if pos.see(move) < 0:
+                    continue
+            if not pos.make(move):
+                continue
+            legal_moves += 1
+            self.qnodes += 1
+            if not self.qnodes & CHECK_TIME_INTERVAL:
+                self.check_time()
+            eval = -self.quiescence_search(pos, ply_from_root + 1, -beta, -alpha)
+            pos.unmake()
+            if self.stopped:
+                return 0
+            if eval >= beta:
+                return beta
+            if eval > alpha:
+                alpha = eval
+        if in_check and not legal_moves:
+            return -MATE_SCORE
+        return alpha
 
-    def is_potential_threefold_repetition(self, board):
-        return board.board_fen() in self.position_counts
+    @staticmethod
+    def has_pieces(pos):
+        """True if the side to move has more than king and pawns, null moves are unsafe without (zugzwang)"""
+        our = pos.pieces[pos.turn]
+        return bool(pos.occupied_co[pos.turn] & ~(our[PAWN] | our[KING]))
 
-    def update_position_counts(self, board):
-        fen = board.board_fen()
-        if fen in self.position_counts:
-            self.position_counts[fen] += 1
-        else:
-            self.position_counts[fen] = 1
+    def is_potential_threefold_repetition(self, pos):
+        """Repeats a position from the game so far or from earlier in the search line"""
+        return pos.is_repetition() or pos.key in self.game_keys
 
     def reset(self):
-        times = [time for _, time, _ in self.time_and_positions]
-        print("average time per move:", sum(times) / len(times))
-        self.position_counts = {}
-        self.time_and_positions = []
+        self.tt.clear()
+        averages = self.telemetry.averages()
+        if averages is not None:
+            print("average time per move:", averages['time'])
+        self.telemetry.new_game()
+        self.game_keys = frozenset()
         self.positions_evaluated = 0
+
+
+def score_to_tt(score, ply_from_root):
+    """
+    Tablebase wins are scored by plies from the root, the table keeps them by plies from the node instead,
+    so a position reached again at another ply gets the right distance. Search mates are flat and pass through
+    """
+    if TB_BOUND < score < MATE_SCORE:
+        return score + ply_from_root
+    if -MATE_SCORE < score < -TB_BOUND:
+        return score - ply_from_root
+    return score
+
+
+def score_from_tt(score, ply_from_root):
+    if TB_BOUND < score < MATE_SCORE:
+        return score - ply_from_root
+    if -MATE_SCORE < score < -TB_BOUND:
+        return score + ply_from_root
+    return score
+
+
+def lazy_smp_worker(worker_id, tt_name, hash_size_mb, jobs, results, stop_event, node_counts, tablebase_dir=None,
+                    selectivity=None):
+    """Helper process of a parallel v3_Minimax, searches every job it gets until told to stop"""
+    tt = SharedTranspositionTable(hash_size_mb, name=tt_name)
+    tablebases = Tablebases(tablebase_dir) if tablebase_dir is not None else None
+    engine = v3_Minimax(None, tt=tt, orderer=MoveOrderer(seed=worker_id), tablebases=tablebases,
+                        **(selectivity or {}))
+    engine.stop_event = stop_event
+    engine.node_counts = node_counts
+    engine.worker_index = worker_id
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        fen, game_keys, depth, budget, age, depth_offset, search_id = job
+        tt.age = age
+        engine.game_keys = game_keys
+        engine.depth = depth
+        engine.positions_evaluated = 0
+        engine.qnodes = 0
+        engine.best_move = None
+        engine.best_eval = None
+        engine.iterative_deepening(chess.Board(fen), budget, depth_offset)
+        results.put((search_id, engine.depth_reached, engine.best_move, engine.best_eval,
+                     engine.positions_evaluated + engine.qnodes))
+    tt.close()